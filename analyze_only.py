@@ -1,16 +1,28 @@
 """
 Standalone AI analysis script.
-Reads code files from results/, sends ALL challenges per user in one API call,
+Reads each user's latest code per challenge from the submission store (falling back to the
+results/ text files for older runs), sends ALL challenges per user in one API call,
 saves per-user review to results/username/_ai_review.txt, and generates final report.
 
-Usage: python analyze_only.py
+Users whose code and prompt are unchanged since the last run are served from the review cache.
+Users are analyzed highest priority first (leaderboard score plus local risk signals) within the
+ANALYSIS_MAX_CALLS / ANALYSIS_MAX_TOKENS budget, and results/Report_partial.* is rewritten as
+they finish.
+
+Usage: python analyze_only.py [--force]
 """
 import os
-import time
-import tqdm
+import argparse
 from analyzer import CodeAnalyzer
-from reporter import ExcelReporter
+from reporter import ExcelReporter, SNAPSHOT_FILE, load_snapshot
 from config import Config
+from similarity import SimilarityEngine
+from organizer import ResultOrganizer
+from store import SubmissionStore, is_real_code
+from metrics import metrics
+from fingerprint_index import FingerprintIndex, annotate_history
+from timeline import analyze_timeline, annotate_timeline
+from scheduler import AnalysisScheduler, PartialReports, skipped_review
 
 def extract_code_from_file(filepath):
     """Extract the last/best code submission from a challenge file."""
@@ -34,8 +46,21 @@ def extract_code_from_file(filepath):
 
     return code
 
+def read_users_from_store(store, contest):
+    """
+    Latest code per user per challenge with one indexed query.
+    Returns (users, languages): {user: {challenge: code}} and {user: {challenge: language}}.
+    """
+    users, languages = {}, {}
+    for user, subs in store.analysis_per_user_challenge(contest).items():
+        challenges = {ch: sub['code'] for ch, sub in subs.items() if is_real_code(sub['code'])}
+        if challenges:
+            users[user] = challenges
+            languages[user] = {ch: subs[ch].get('language') for ch in challenges}
+    return users, languages
+
 def read_all_users(results_dir):
-    """Read all users and their challenge codes from results/ folder."""
+    """Read all users and their challenge codes from results/ folder (legacy text tree)."""
     users = {}
 
     for username in sorted(os.listdir(results_dir)):
@@ -52,7 +77,7 @@ def read_all_users(results_dir):
             filepath = os.path.join(user_dir, filename)
             code = extract_code_from_file(filepath)
 
-            if code and len(code.strip()) > 10:
+            if is_real_code(code):
                 challenges[challenge_name] = code
 
         if challenges:
@@ -60,6 +85,32 @@ def read_all_users(results_dir):
 
     return users
 
+def read_leaderboard(results_dir):
+    """Leaderboard from the report snapshot, falling back to the newest legacy text report."""
+    rows = load_snapshot(results_dir)
+    if rows:
+        print(f"Reading leaderboard from: {os.path.join(results_dir, SNAPSHOT_FILE)}")
+        return [{'username': r['username'], 'score': r.get('score'), 'time_taken': r.get('time_taken'), 'rank': r.get('rank')}
+                for r in rows]
+
+    reports = sorted(f for f in os.listdir(results_dir) if f.startswith('Report_') and f.endswith('.txt'))
+    if not reports:
+        return []
+    report_path = os.path.join(results_dir, reports[-1])
+    print(f"Reading leaderboard from: {report_path}")
+    leaderboard = []
+    with open(report_path, 'r', encoding='utf-8') as fp:
+        lines = fp.readlines()[2:]  # Skip header + separator
+        for line in lines:
+            parts = line.strip().split('\t')
+            if len(parts) >= 3:
+                leaderboard.append({
+                    'username': parts[0].strip(),
+                    'score': parts[1].strip(),
+                    'time_taken': parts[2].strip(),
+                })
+    return leaderboard
+
 def save_user_review(user_dir, review_data):
     """Save AI review to user's folder as _ai_review.txt"""
     filepath = os.path.join(user_dir, '_ai_review.txt')
@@ -75,47 +126,82 @@ def save_user_review(user_dir, review_data):
             f.write(f"Note: {ch.get('summary', '')}\n")
             f.write("-" * 30 + "\n")
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run AI analysis over an existing results/ folder.")
+    parser.add_argument("--force", action="store_true", help="Ignore cached AI reviews and re-analyze every user")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
     print("🤖 AI Analysis Only Mode\n")
 
-    analyzer = CodeAnalyzer()
+    analyzer = CodeAnalyzer(force=args.force or None)
     if not analyzer.model:
         print("❌ GEMINI_API_KEY missing.")
         return
-
-    user_codes = read_all_users(Config.OUTPUT_DIR)
+    metrics.reset()
+    metrics.start_periodic(Config.OUTPUT_DIR)
+
+    organizer = ResultOrganizer(Config.OUTPUT_DIR)
+    store = SubmissionStore(Config.STORE_PATH) if os.path.exists(Config.STORE_PATH) else None
+    from_store = bool(store and Config.CONTEST_SLUG and store.has_contest(Config.CONTEST_SLUG))
+    if from_store:
+        print(f"Reading submissions from: {Config.STORE_PATH}")
+        user_codes, languages = read_users_from_store(store, Config.CONTEST_SLUG)
+    else:
+        # Text files carry no language, so comments are not stripped from these prompts
+        user_codes, languages = read_all_users(Config.OUTPUT_DIR), {}
     print(f"Found {len(user_codes)} users.\n")
 
     if not user_codes:
+        metrics.stop_periodic()
         return
 
-    # Read existing leaderboard from previous report
-    leaderboard = []
-    for f in sorted(os.listdir(Config.OUTPUT_DIR)):
-        if f.startswith('Report_') and f.endswith('.txt'):
-            report_path = os.path.join(Config.OUTPUT_DIR, f)
-            print(f"Reading leaderboard from: {report_path}")
-            with open(report_path, 'r', encoding='utf-8') as fp:
-                lines = fp.readlines()[2:]  # Skip header + separator
-                for line in lines:
-                    parts = line.strip().split('\t')
-                    if len(parts) >= 3:
-                        leaderboard.append({
-                            'username': parts[0].strip(),
-                            'score': float(parts[1].strip()) if parts[1].strip() else 0,
-                            'time_taken': float(parts[2].strip()) if parts[2].strip() else 0,
-                        })
-            break  # Use first (oldest) report
-
-    # Run AI analysis per user (one API call per user)
+    leaderboard = read_leaderboard(Config.OUTPUT_DIR)
+
+    # Local cross-user similarity (no API calls)
+    with metrics.stage("similarity"):
+        engine = SimilarityEngine()
+        for user, challenges in user_codes.items():
+            for ch, code in challenges.items():
+                engine.add(user, ch, code, languages.get(user, {}).get(ch))
+        similarity = engine.run()
+    similarity.write_clusters(os.path.join(Config.OUTPUT_DIR, '_similarity_clusters.txt'))
+    print(f"Found {len(similarity.clusters)} similarity clusters.\n")
+
+    # Matches against earlier contests (needs submission ids, so only when reading the store)
+    history = {}
+    if from_store and Config.HISTORY_INDEX_PATH:
+        index = FingerprintIndex(Config.HISTORY_INDEX_PATH)
+        history = index.match_and_add(Config.CONTEST_SLUG, store.analysis_per_user_challenge(Config.CONTEST_SLUG))
+        index.close()
+        print(f"{len(history)} users match submissions from earlier contests.\n")
+
+    # Submission-timeline outliers (needs attempt times, so only when reading the store)
+    timeline = None
+    if from_store:
+        with metrics.stage("timeline"):
+            timeline = analyze_timeline(store, Config.CONTEST_SLUG)
+        timeline.write_csv(os.path.join(Config.OUTPUT_DIR, '_timeline_features.csv'))
+        print(f"{int(timeline.flagged.any(axis=0).sum())} users have outlying submission timelines.\n")
+
+    # Highest priority first; trivially low-value users are not sent at all
+    scheduler = AnalysisScheduler(leaderboard)
+    scheduler.add_signals(timeline=timeline, similarity=similarity, history=history)
+    user_codes, skipped = scheduler.plan(user_codes)
+    if skipped:
+        print(f"Skipping {len(skipped)} users with a score of at most {Config.ANALYSIS_MIN_SCORE:g} and no risk signals.\n")
+
+    # Run AI analysis per user (one API call per user, several in flight)
     analysis = {}
+    partial = PartialReports(Config.OUTPUT_DIR)
 
-    for user, challenges in tqdm.tqdm(user_codes.items(), desc="Analyzing"):
-        review = analyzer.analyze_user(user, challenges)
-
-        # Save to user folder
-        user_dir = os.path.join(Config.OUTPUT_DIR, user)
-        save_user_review(user_dir, review)
+    def collect(user, review):
+        # Save to user folder (skipped users keep any earlier review)
+        if not review.get('skipped'):
+            user_dir = os.path.join(Config.OUTPUT_DIR, organizer.sanitize(user))
+            os.makedirs(user_dir, exist_ok=True)
+            save_user_review(user_dir, review)
 
         # Collect for report
         prob = review.get('overall_cheating_probability', 0)
@@ -132,15 +218,33 @@ def main():
             notes += " | " + " ".join(ch_notes)
 
         analysis[user] = {'cheating_score': prob, 'notes': notes}
-
-        time.sleep(0.5)
+        match = similarity.users.get(user)
+        if match:
+            analysis[user].update(similarity=similarity.user_score(user), similar_to=match['similar_to'])
+        annotate_history({user: analysis[user]}, history)
+        if timeline is not None:
+            annotate_timeline({user: analysis[user]}, timeline)
+        if review.get('skipped'): return
+        partial.user_done(leaderboard, analysis)
+
+    for user in skipped:
+        collect(user, skipped_review("low score, no risk signals"))
+
+    with metrics.stage("analysis"):
+        analyzer.analyze_many(user_codes, on_result=collect, languages=languages, contest=Config.CONTEST_SLUG)
+    usage = analyzer.write_usage(os.path.join(Config.OUTPUT_DIR, '_token_usage.json'))
+    print(f"Gemini tokens: {usage['total_tokens']} over {usage['requests']} requests.")
+    print(f"AI budget used: {analyzer.budget.summary()}")
 
     # Generate final report
     if not leaderboard:
         leaderboard = [{'username': u, 'score': 0, 'time_taken': 0} for u in user_codes]
 
     reporter = ExcelReporter(Config.OUTPUT_DIR)
-    reporter.generate(leaderboard, analysis)
+    with metrics.stage("report"):
+        reporter.generate(leaderboard, analysis)
+    partial.discard()
+    metrics.finish(Config.OUTPUT_DIR)
     print("\n✨ Done!")
 
 if __name__ == "__main__":
@@ -1,8 +1,17 @@
+import re
 import json
 import time
+import tqdm
+import threading
 import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pydantic import BaseModel, Field
 from config import Config
+from ratelimit import RateLimiter
+from review_cache import ReviewCache, review_key
+from scheduler import AnalysisBudget, skipped_review
+from prompt_builder import build_code_sections
+from metrics import metrics
 from typing import List
 
 class ChallengeReview(BaseModel):
@@ -15,61 +24,375 @@ class UserReview(BaseModel):
     overall_summary: str = Field(description="Overall summary of user behavior")
     challenges: List[ChallengeReview] = Field(description="Per-challenge analysis")
 
+class UserBatchReview(UserReview):
+    username: str = Field(description="Username exactly as given in the USER header")
+
+class BatchReview(BaseModel):
+    reviews: List[UserBatchReview] = Field(description="One review per user, in any order")
+
+MODEL_NAME = 'gemini-2.0-flash'
+# Bump whenever the prompt text changes so cached reviews are not reused
+PROMPT_VERSION = 3
+
+CRITERIA = """DETECTION CRITERIA (red flags):
+- Code solved too perfectly on first attempt for a beginner
+- Advanced algorithms/patterns not expected from beginners
+- Hardcoded outputs instead of real logic
+- Generic variable names with complex logic = likely copied
+- Competitive programming templates or AI-generated patterns
+- Code style inconsistent across challenges (different person wrote each)
+
+SCORING GUIDE for cheating_probability (per challenge AND overall):
+- 0-20%: Original work, has beginner mistakes
+- 20-50%: Some parts may be from online sources but adapted
+- 50-80%: Likely copied or AI-generated
+- 80-100%: Definitely copied/AI/hardcoded
+
+Give an OVERALL probability considering all challenges together.
+If all solutions are suspiciously perfect, overall should be high."""
+
+PROMPT_TEMPLATE = """You are an expert anti-cheating analyst for a beginner-level programming contest.
+Analyze ALL code submissions below for user "{username}".
+Code may have been compacted before sending (comments/blank lines removed, very long submissions truncated); do not treat that as a signal.
+
+""" + CRITERIA + """
+
+{all_code}"""
+
+# Several users per request: the criteria text and request latency are paid once per batch
+BATCH_PROMPT_TEMPLATE = """You are an expert anti-cheating analyst for a beginner-level programming contest.
+Below are the code submissions of {count} different users, each under its own "##### USER: <name> #####" header.
+Analyze every user independently: never compare users with each other or let one user's code affect another's review.
+Return exactly one review per user, with "username" copied exactly from its header.
+Code may have been compacted before sending (comments/blank lines removed, very long submissions truncated); do not treat that as a signal.
+
+""" + CRITERIA + """
+
+{all_users}"""
+
+USER_HEADER = "##### USER: {username} #####"
+
+def _split(total, weights):
+    """Split an integer total across { key: weight } in proportion, summing exactly to total."""
+    whole = sum(weights.values())
+    parts = {key: total * weight // whole for key, weight in weights.items()}
+    for key in sorted(weights, key=lambda k: -weights[k])[:total - sum(parts.values())]:
+        parts[key] += 1
+    return parts
+
 class CodeAnalyzer:
-    def __init__(self):
+    def __init__(self, force=None, review_cache=None, budget=None):
+        self.force = Config.FORCE_REANALYZE if force is None else force
+        self.budget = budget or AnalysisBudget()
+        if review_cache is None and Config.REVIEW_CACHE_PATH:
+            review_cache = ReviewCache(Config.REVIEW_CACHE_PATH)
+        self.review_cache = review_cache
+
         if Config.GEMINI_API_KEY:
             genai.configure(api_key=Config.GEMINI_API_KEY)
             self.model = genai.GenerativeModel(
-                model_name='gemini-2.0-flash',
+                model_name=MODEL_NAME,
                 generation_config={
                     "response_mime_type": "application/json",
                     "response_schema": UserReview
                 }
             )
+            self.batch_model = genai.GenerativeModel(
+                model_name=MODEL_NAME,
+                generation_config={
+                    "response_mime_type": "application/json",
+                    "response_schema": BatchReview
+                }
+            )
         else:
             self.model = None
+            self.batch_model = None
 
-    def analyze_user(self, username, challenge_codes):
+        # Shared quota across all in-flight requests
+        self.request_limiter = RateLimiter(Config.GEMINI_RPM / 60, burst=max(1, Config.GEMINI_MAX_IN_FLIGHT), name="gemini_requests")
+        self.token_limiter = RateLimiter(Config.GEMINI_TPM / 60, burst=Config.GEMINI_TPM, name="gemini_tokens") if Config.GEMINI_TPM else None
+        self.usage = {}
+        self.requests = 0
+        self.usage_lock = threading.Lock()
+
+    @staticmethod
+    def _is_quota_error(e):
+        name = type(e).__name__
+        text = str(e).lower()
+        return name in ("ResourceExhausted", "TooManyRequests") or "429" in text or "quota" in text or "rate limit" in text
+
+    @staticmethod
+    def _retry_delay(e, attempt):
+        """Use the server-suggested delay when the error carries one, else exponential backoff."""
+        m = re.search(r"retry[_ ]delay\D*(\d+(?:\.\d+)?)", str(e), re.IGNORECASE)
+        if m:
+            return float(m.group(1))
+        return min(60, 5 * 2 ** attempt)
+
+    def _generate(self, prompt, tokens, model=None):
+        """generate_content under the RPM/TPM limits, retrying quota errors with backoff."""
+        model = model or self.model
+        for attempt in range(Config.GEMINI_MAX_RETRIES):
+            self.request_limiter.acquire()
+            if self.token_limiter: self.token_limiter.acquire(tokens)
+            started = time.perf_counter()
+            try:
+                resp = model.generate_content(prompt)
+                metrics.observe("llm_request_seconds", time.perf_counter() - started, outcome="ok")
+                return resp
+            except Exception as e:
+                quota = self._is_quota_error(e)
+                metrics.observe("llm_request_seconds", time.perf_counter() - started, outcome="quota" if quota else "error")
+                if not quota or attempt == Config.GEMINI_MAX_RETRIES - 1:
+                    raise
+                wait_time = self._retry_delay(e, attempt)
+                metrics.inc("llm_retries_total")
+                tqdm.tqdm.write(f"⚠️ Gemini quota hit. Waiting {wait_time:.0f}s...")
+                # Back off every worker, not just this one
+                self.request_limiter.pause(wait_time)
+
+    def analyze_user(self, username, challenge_codes, languages=None, contest=None):
         """
         Analyze ALL challenges for a user in a single API call.
         challenge_codes: dict { "Challenge Name": "source code" }
+        languages: optional dict { "Challenge Name": language }; comments are only stripped where known
+        contest: slug the token usage is recorded under (one analyzer may serve several contests)
         Returns UserReview-like dict.
         """
         if not self.model:
             return {"overall_cheating_probability": 0, "overall_summary": "API key missing", "challenges": []}
 
-        # Build combined prompt with all challenges
-        code_sections = []
-        for ch_name, code in challenge_codes.items():
-            code_sections.append(f"=== Challenge: {ch_name} ===\n{code}\n")
+        cache_key = review_key(MODEL_NAME, PROMPT_VERSION, username, challenge_codes)
+        cached = self._cached(cache_key)
+        if cached is not None:
+            return cached
 
-        all_code = "\n".join(code_sections)
+        if self.budget.exhausted:
+            metrics.inc("llm_skipped_total", reason="budget")
+            return skipped_review("AI budget exhausted")
+        prompt, prompt_tokens = self.build_prompt(username, challenge_codes, languages)
+        if not self.budget.reserve(prompt_tokens):
+            metrics.inc("llm_skipped_total", reason="budget")
+            return skipped_review("AI budget exhausted")
 
-        prompt = f"""You are an expert anti-cheating analyst for a beginner-level programming contest.
-Analyze ALL code submissions below for user "{username}".
+        try:
+            started = time.time()
+            resp = self._generate(prompt, prompt_tokens)
+            self._record_usage(contest, {username: 1}, prompt_tokens, resp, time.time() - started)
+            data = json.loads(resp.text)
+            # Only well-formed reviews are cached; errors are retried on the next run
+            UserReview.model_validate(data)
+            if self.review_cache:
+                self.review_cache.put(cache_key, username, data)
+            return data
+        except Exception as e:
+            metrics.inc("llm_errors_total")
+            return {"overall_cheating_probability": 0, "overall_summary": f"AI Error: {str(e)}", "challenges": []}
 
-DETECTION CRITERIA (red flags):
-- Code solved too perfectly on first attempt for a beginner
-- Advanced algorithms/patterns not expected from beginners
-- Hardcoded outputs instead of real logic
-- Generic variable names with complex logic = likely copied
-- Competitive programming templates or AI-generated patterns
-- Code style inconsistent across challenges (different person wrote each)
+    def _cached(self, cache_key):
+        if not self.review_cache or self.force:
+            return None
+        cached = self.review_cache.get(cache_key)
+        if cached is not None:
+            metrics.inc("review_cache_hits_total")
+        return cached
 
-SCORING GUIDE for cheating_probability (per challenge AND overall):
-- 0-20%: Original work, has beginner mistakes
-- 20-50%: Some parts may be from online sources but adapted
-- 50-80%: Likely copied or AI-generated
-- 80-100%: Definitely copied/AI/hardcoded
+    def analyze_batch(self, user_codes, languages=None, contest=None):
+        """
+        Analyze several users in one API call (see pack_batches).
+        languages: optional dict { username: { "Challenge Name": language } }
+        Users missing from the response or with a malformed review fall back to analyze_user.
+        Returns dict { username: review }.
+        """
+        languages = languages or {}
+        if not self.model or len(user_codes) < 2:
+            return {user: self.analyze_user(user, codes, languages.get(user), contest) for user, codes in user_codes.items()}
 
-Give an OVERALL probability considering all challenges together.
-If all solutions are suspiciously perfect, overall should be high.
+        reviews, pending = {}, {}
+        for user, codes in user_codes.items():
+            cache_key = review_key(MODEL_NAME, PROMPT_VERSION, user, codes)
+            cached = self._cached(cache_key)
+            if cached is not None:
+                reviews[user] = cached
+            else:
+                pending[user] = (codes, cache_key)
 
-{all_code}"""
+        if len(pending) >= 2 and not self.budget.exhausted:
+            prompt, prompt_tokens = self.build_batch_prompt({user: codes for user, (codes, _) in pending.items()}, languages)
+            if self.budget.reserve(prompt_tokens):
+                try:
+                    started = time.time()
+                    resp = self._generate(prompt, prompt_tokens, model=self.batch_model)
+                    # Each user is charged in proportion to the code it put in the prompt
+                    shares = {user: len(build_code_sections(codes, languages=languages.get(user))) + 1
+                              for user, (codes, _) in pending.items()}
+                    self._record_usage(contest, shares, prompt_tokens, resp, time.time() - started)
+                    returned = json.loads(resp.text).get("reviews") or []
+                except Exception as e:
+                    metrics.inc("llm_errors_total")
+                    tqdm.tqdm.write(f"⚠️ Batched review of {len(pending)} users failed ({e}); reviewing them one by one.")
+                    returned = []
+
+                for item in returned:
+                    if not isinstance(item, dict): continue
+                    user = str(item.pop("username", "")).strip()
+                    if user not in pending or user in reviews: continue
+                    try:
+                        UserReview.model_validate(item)
+                    except Exception:
+                        continue
+                    reviews[user] = item
+                    if self.review_cache:
+                        self.review_cache.put(pending[user][1], user, item)
+                metrics.inc("llm_batched_users_total", sum(1 for user in pending if user in reviews))
+
+        missing = [user for user in pending if user not in reviews]
+        if missing: metrics.inc("llm_batch_fallbacks_total", len(missing))
+        for user in missing:
+            reviews[user] = self.analyze_user(user, pending[user][0], languages.get(user), contest)
+        return {user: reviews[user] for user in user_codes}
+
+    def pack_batches(self, user_codes, languages=None):
+        """
+        Split { username: codes } (order kept) into batches of at most GEMINI_BATCH_SIZE users
+        whose estimated prompt fits PROMPT_TOKEN_BUDGET. Users needing more than half the budget
+        on their own go alone.
+        """
+        size = Config.GEMINI_BATCH_SIZE
+        if size <= 1:
+            return [{user: codes} for user, codes in user_codes.items()]
+        overhead = len(BATCH_PROMPT_TEMPLATE) // 4
+        room = (Config.PROMPT_TOKEN_BUDGET or 1 << 30) - overhead
+
+        batches, current, used = [], {}, 0
+        for user, codes in user_codes.items():
+            tokens = self.estimate_tokens(build_code_sections(codes, languages=(languages or {}).get(user)) + user) + 10
+            if tokens > room // 2:
+                batches.append({user: codes})
+                continue
+            if current and (len(current) >= size or used + tokens > room):
+                batches.append(current)
+                current, used = {}, 0
+            current[user] = codes
+            used += tokens
+        if current: batches.append(current)
+        return batches
+
+    def build_batch_prompt(self, user_codes, languages=None):
+        """Like build_prompt, for several users under one header each. Returns (prompt, token_count)."""
+        def render(max_chars):
+            sections = [f"{USER_HEADER.format(username=user)}\n{build_code_sections(codes, max_chars, (languages or {}).get(user))}"
+                        for user, codes in user_codes.items()]
+            return BATCH_PROMPT_TEMPLATE.format(count=len(user_codes), all_users="\n\n".join(sections))
+        return self._fit_budget(render, user_codes.values())
 
+    @staticmethod
+    def estimate_tokens(prompt):
+        """Local ~4 chars/token estimate (no API call)."""
+        return max(1, len(prompt) // 4)
+
+    def count_tokens(self, prompt):
+        """Exact count from the API, falling back to the local estimate."""
         try:
-            resp = self.model.generate_content(prompt)
-            data = json.loads(resp.text)
-            return data
-        except Exception as e:
-            return {"overall_cheating_probability": 0, "overall_summary": f"AI Error: {str(e)}", "challenges": []}
+            return self.model.count_tokens(prompt).total_tokens
+        except Exception:
+            return self.estimate_tokens(prompt)
+
+    def build_prompt(self, username, challenge_codes, languages=None):
+        """
+        Compact the code and shrink the per-challenge size cap until the prompt fits
+        PROMPT_TOKEN_BUDGET. Returns (prompt, token_count).
+        """
+        render = lambda max_chars: PROMPT_TEMPLATE.format(
+            username=username, all_code=build_code_sections(challenge_codes, max_chars, languages))
+        return self._fit_budget(render, [challenge_codes])
+
+    def _fit_budget(self, render, code_maps):
+        """
+        render(max_chars) -> prompt. The per-challenge cap is shrunk against the local token
+        estimate, then the final prompt is counted once with the API. A prompt still over
+        PROMPT_TOKEN_BUDGET (the 200-char floor, or a loose estimate) has its code tail cut off.
+        """
+        budget = Config.PROMPT_TOKEN_BUDGET
+        max_chars = Config.PROMPT_MAX_CHARS_PER_CHALLENGE
+        longest = max((len(code) for codes in code_maps for code in codes.values()), default=0)
+        for _ in range(5):
+            prompt = render(max_chars)
+            tokens = self.estimate_tokens(prompt)
+            if not budget or tokens <= budget:
+                break
+            cap = min(max_chars, longest) if max_chars > 0 else longest
+            max_chars = max(200, int(cap * budget / tokens * 0.9))
+
+        tokens = self.count_tokens(prompt)
+        if budget and tokens > budget:
+            # Code comes last in both templates, so only code is cut
+            keep = int(len(prompt) * budget / tokens * 0.95)
+            tokens = min(budget, int(tokens * keep / len(prompt)) + 10)
+            prompt = prompt[:keep] + "\n... [truncated to fit the token budget]"
+        return prompt, tokens
+
+    def _record_usage(self, contest, shares, prompt_tokens, resp, latency):
+        """
+        Record one request's tokens, split across { username: weight } (a single user for
+        analyze_user). Users seen again, e.g. a batch fallback, accumulate.
+        """
+        meta = getattr(resp, "usage_metadata", None)
+        metrics.inc("llm_tokens_total", getattr(meta, "prompt_token_count", None) or prompt_tokens, kind="prompt")
+        metrics.inc("llm_tokens_total", getattr(meta, "candidates_token_count", None) or 0, kind="output")
+        counts = {
+            "counted_prompt_tokens": prompt_tokens,
+            "prompt_tokens": getattr(meta, "prompt_token_count", None) or prompt_tokens,
+            "output_tokens": getattr(meta, "candidates_token_count", None) or 0,
+            "total_tokens": getattr(meta, "total_token_count", None) or prompt_tokens,
+        }
+        split = {field: _split(value, shares) for field, value in counts.items()}
+        with self.usage_lock:
+            self.requests += 1
+            for user in shares:
+                entry = self.usage.setdefault((contest, user), dict.fromkeys([*counts, "requests", "latency_seconds"], 0))
+                for field in counts:
+                    entry[field] += split[field][user]
+                entry["requests"] += 1
+                entry["latency_seconds"] = round(entry["latency_seconds"] + latency, 2)
+
+    def write_usage(self, path):
+        """Dump per-user token usage (only users that actually hit the API) as JSON, one entry per (contest, user)."""
+        with self.usage_lock:
+            usage = dict(self.usage)
+            requests = self.requests
+        totals = {
+            "users": len(usage),
+            "requests": requests,
+            "prompt_tokens": sum(u["prompt_tokens"] or 0 for u in usage.values()),
+            "output_tokens": sum(u["output_tokens"] or 0 for u in usage.values()),
+            "total_tokens": sum(u["total_tokens"] or 0 for u in usage.values()),
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            users = [{"contest": contest, "username": user, **entry} for (contest, user), entry in sorted(usage.items(), key=str)]
+            json.dump({"totals": totals, "users": users}, f, indent=2, ensure_ascii=False)
+        return totals
+
+    def analyze_many(self, user_codes, on_result=None, desc="Analyzing", languages=None, contest=None):
+        """
+        Analyze many users concurrently (at most GEMINI_MAX_IN_FLIGHT requests in flight),
+        GEMINI_BATCH_SIZE users per request when batching is enabled.
+        user_codes: dict { username: { "Challenge Name": "source code" } }, started in dict order
+        languages: optional dict { username: { "Challenge Name": language } }
+        on_result(username, review) is called from the calling thread as each user finishes.
+        Returns dict { username: review }.
+        """
+        reviews = {}
+        if not user_codes:
+            return reviews
+
+        with ThreadPoolExecutor(max_workers=max(1, Config.GEMINI_MAX_IN_FLIGHT)) as pool:
+            futures = [pool.submit(self.analyze_batch, batch, languages, contest) for batch in self.pack_batches(user_codes, languages)]
+            with tqdm.tqdm(total=len(user_codes), desc=desc) as bar:
+                for future in as_completed(futures):
+                    for user, review in future.result().items():
+                        reviews[user] = review
+                        if on_result: on_result(user, review)
+                        bar.update(1)
+
+        return reviews
@@ -0,0 +1,134 @@
+"""
+Multi-contest batch mode.
+
+Runs several contests at once in one process, sharing the HTTP connection pool, the global
+HackerRank rate limiter, the source cache, the review cache and the Gemini quota. Each contest
+is written to results/<slug>/; results/_batch_summary.csv combines every user across contests.
+
+Usage: python batch.py slug-one slug-two ... [--workers N] [--force]
+       (or set CONTEST_SLUGS=slug-one,slug-two)
+"""
+import os
+import csv
+import queue
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from collector import HackerRankCollector, make_session
+from analyzer import CodeAnalyzer
+from config import Config
+from ratelimit import RateLimiter
+from source_cache import SourceCache
+from store import SubmissionStore
+from records import parse_number
+from organizer import ResultOrganizer
+from metrics import metrics
+from main import run_contest, peak_rss_mb
+
+SUMMARY_FIELDS = ["username", "contests", "total_score", "max_cheating_score", "mean_cheating_score",
+                  "max_similarity", "per_contest"]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Collect and analyze several HackerRank contests at once.")
+    parser.add_argument("slugs", nargs="*", help="Contest slugs (default: CONTEST_SLUGS)")
+    parser.add_argument("--workers", type=int, default=None, help="Contests processed concurrently (default: BATCH_CONTEST_WORKERS)")
+    parser.add_argument("--force", action="store_true", help="Ignore cached AI reviews and re-analyze every user")
+    return parser.parse_args(argv)
+
+def summarize(results):
+    """
+    Combine per-contest results into one row per user.
+    results: { slug: {"leaderboard": [...], "analysis": {user: row}} }
+    """
+    users = {}
+    for slug, result in results.items():
+        scores = {row.get('username'): row.get('score') for row in result["leaderboard"]}
+        analysis = result["analysis"]
+        for user in set(scores) | set(analysis):
+            if not user: continue
+            notes = analysis.get(user, {})
+            entry = users.setdefault(user, {"username": user, "scores": {}, "cheating": [], "similarity": []})
+            entry["scores"][slug] = parse_number(scores.get(user), 0.0)
+            entry["cheating"].append(parse_number(notes.get('cheating_score'), 0.0))
+            entry["similarity"].append(parse_number(notes.get('similarity'), 0.0))
+
+    rows = []
+    for entry in users.values():
+        cheating = entry["cheating"]
+        rows.append({
+            "username": entry["username"],
+            "contests": len(entry["scores"]),
+            "total_score": round(sum(entry["scores"].values()), 2),
+            "max_cheating_score": max(cheating),
+            "mean_cheating_score": round(sum(cheating) / len(cheating), 1),
+            "max_similarity": max(entry["similarity"]),
+            "per_contest": "; ".join(f"{slug}: {score:g}" for slug, score in sorted(entry["scores"].items())),
+        })
+    # Most suspicious first
+    rows.sort(key=lambda r: (-r["max_cheating_score"], -r["max_similarity"], -r["total_score"], r["username"]))
+    return rows
+
+def write_summary(rows, path):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+def main(argv=None):
+    args = parse_args(argv)
+    slugs = list(dict.fromkeys(args.slugs or Config.CONTEST_SLUGS))
+    if not slugs:
+        print("❌ No contests given (pass slugs or set CONTEST_SLUGS).")
+        return
+    workers = max(1, min(len(slugs), args.workers or Config.BATCH_CONTEST_WORKERS))
+    print(f"🚀 Batch analysis of {len(slugs)} contests ({workers} at a time)...")
+    Config.validate(require_slug=False)
+    metrics.reset()
+    metrics.start_periodic(Config.OUTPUT_DIR)
+
+    # Shared by every contest: one connection pool, one request budget, one set of caches
+    session = make_session(contests=workers)
+    limiter = RateLimiter(Config.REQUESTS_PER_SECOND, name="hackerrank")
+    source_cache = SourceCache(Config.SOURCE_CACHE_PATH) if Config.SOURCE_CACHE_PATH else None
+    analyzer = CodeAnalyzer(force=args.force or None)
+    store = SubmissionStore(Config.STORE_PATH)
+    sanitize = ResultOrganizer(Config.OUTPUT_DIR).sanitize
+    # One progress-bar slot per concurrent contest, handed back when the contest finishes
+    bar_slots = queue.Queue()
+    for slot in range(workers): bar_slots.put(slot)
+
+    def process(slug):
+        collector = HackerRankCollector(limiter=limiter, source_cache=source_cache, slug=slug, session=session)
+        slot = bar_slots.get()
+        try:
+            return run_contest(collector, analyzer, store, os.path.join(Config.OUTPUT_DIR, sanitize(slug)), bar_slot=slot)
+        finally:
+            bar_slots.put(slot)
+
+    results, failed = {}, []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {slug: pool.submit(process, slug) for slug in slugs}
+        for slug, future in futures.items():
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ {slug}: {e}")
+                result = None
+            if result is None: failed.append(slug)
+            else: results[slug] = result
+
+    os.makedirs(Config.OUTPUT_DIR, exist_ok=True)
+    usage = analyzer.write_usage(os.path.join(Config.OUTPUT_DIR, '_token_usage.json'))
+    print(f"Gemini tokens: {usage['total_tokens']} over {usage['requests']} requests.")
+    if results:
+        path = write_summary(summarize(results), os.path.join(Config.OUTPUT_DIR, '_batch_summary.csv'))
+        print(f"Batch summary saved: {path}")
+    if failed:
+        print(f"⚠️ Incomplete contests (rerun to resume): {', '.join(failed)}")
+    metrics.finish(Config.OUTPUT_DIR)
+    peak = peak_rss_mb()
+    if peak: print(f"Peak memory: {peak:.0f} MB")
+    print("Done!")
+
+if __name__ == "__main__":
+    main()
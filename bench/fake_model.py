@@ -0,0 +1,108 @@
+"""
+Fake google.generativeai backend with configurable latency and failure rates.
+"""
+import json
+import time
+import random
+import threading
+
+class _Usage:
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+class _Response:
+    def __init__(self, text, prompt_tokens):
+        self.text = text
+        self.usage_metadata = _Usage(prompt_tokens, max(1, len(text) // 4))
+
+class _TokenCount:
+    def __init__(self, total_tokens):
+        self.total_tokens = total_tokens
+
+class ResourceExhausted(Exception):
+    """Same class name as google.api_core's quota error."""
+
+class FakeGenerativeModel:
+    """
+    latency:      seconds per generate_content call
+    failure_rate: probability of a non-retryable error
+    quota_rate:   probability of a 429 quota error
+    drop_rate:    probability that a user is left out of a batched response
+    """
+    def __init__(self, latency=0.0, failure_rate=0.0, quota_rate=0.0, drop_rate=0.0, seed=3, **kwargs):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.quota_rate = quota_rate
+        self.drop_rate = drop_rate
+        self.generation_config = kwargs.get("generation_config", {})
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.quota_errors = 0
+        self.prompt_tokens = 0
+
+    def count_tokens(self, prompt):
+        return _TokenCount(max(1, len(prompt) // 4))
+
+    def generate_content(self, prompt):
+        with self.lock:
+            self.calls += 1
+            roll = self.rng.random()
+        if self.latency:
+            time.sleep(self.latency)
+        if roll < self.quota_rate:
+            with self.lock: self.quota_errors += 1
+            raise ResourceExhausted("429 Resource has been exhausted (e.g. check quota). retry_delay { seconds: 0 }")
+        if roll < self.quota_rate + self.failure_rate:
+            with self.lock: self.failures += 1
+            raise RuntimeError("500 Internal error encountered.")
+
+        tokens = max(1, len(prompt) // 4)
+        with self.lock: self.prompt_tokens += tokens
+        schema = getattr(self.generation_config.get("response_schema"), "__name__", "")
+        if schema != "BatchReview":
+            return _Response(json.dumps(self._review(prompt)), tokens)
+
+        reviews = []
+        for part in prompt.split("##### USER: ")[1:]:
+            username, _, body = part.partition(" #####")
+            with self.lock:
+                dropped = self.rng.random() < self.drop_rate
+            if not dropped:
+                reviews.append(dict(self._review(body), username=username))
+        return _Response(json.dumps({"reviews": reviews}), tokens)
+
+    @staticmethod
+    def _review(text):
+        challenges = [line[len("=== Challenge: "):-len(" ===")] for line in text.split("\n")
+                      if line.startswith("=== Challenge: ") and line.endswith(" ===")]
+        return {
+            "overall_cheating_probability": len(text) % 100,
+            "overall_summary": "benchmark review",
+            "challenges": [{"challenge_name": c, "cheating_probability": 10, "summary": "ok"} for c in challenges],
+        }
+
+class FakeGenAI:
+    """Drop-in for the google.generativeai module functions CodeAnalyzer uses."""
+    def __init__(self, **model_options):
+        self.model_options = model_options
+        self.models = []
+
+    def configure(self, **kwargs):
+        pass
+
+    def GenerativeModel(self, **kwargs):
+        model = FakeGenerativeModel(**self.model_options, **kwargs)
+        self.models.append(model)
+        return model
+
+    def stats(self):
+        return {
+            "calls": sum(m.calls for m in self.models),
+            "failures": sum(m.failures for m in self.models),
+            "quota_errors": sum(m.quota_errors for m in self.models),
+            "prompt_tokens": sum(m.prompt_tokens for m in self.models),
+        }
@@ -0,0 +1,172 @@
+"""
+Local stand-in for the HackerRank /rest/contests/<slug>/... endpoints.
+
+Serves a synthetic contest with configurable size, latency, 429 injection and pagination
+behaviour, and counts every request it answers.
+"""
+import json
+import time
+import hashlib
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# A few solution templates; users either write their own variation or copy someone else's
+_TEMPLATES = [
+    "#include <bits/stdc++.h>\nusing namespace std;\nint main() {{\n    int n; cin >> n;\n    long long {acc} = 0;\n    for (int {i} = 0; {i} < n; {i}++) {{ int x; cin >> x; {acc} += x; }}\n    cout << {acc} << endl;\n    return 0;\n}}\n",
+    "n = int(input())\n{acc} = list(map(int, input().split()))\nbest = 0\nfor {i} in range(n):\n    if {acc}[{i}] > best:\n        best = {acc}[{i}]\nprint(best)\n",
+    "import java.util.*;\npublic class Solution {{\n    public static void main(String[] args) {{\n        Scanner sc = new Scanner(System.in);\n        int n = sc.nextInt();\n        int[] {acc} = new int[n];\n        for (int {i} = 0; {i} < n; {i}++) {acc}[{i}] = sc.nextInt();\n        Arrays.sort({acc});\n        System.out.println({acc}[n - 1]);\n    }}\n}}\n",
+]
+_LANGUAGES = ["cpp14", "python3", "java8"]
+
+class MockContest:
+    def __init__(self, users=100, challenges=4, attempts=3, copy_rate=0.1, seed=7):
+        rng = random.Random(seed)
+        self.challenges = [{"name": f"Challenge {c + 1}", "slug": f"challenge-{c + 1}", "max_score": 100} for c in range(challenges)]
+        self.submissions = []
+        self.codes = {}
+        sub_id = 1000
+        t0 = 1700000000
+        for u in range(users):
+            user = f"user{u:05d}"
+            for c, ch in enumerate(self.challenges):
+                for a in range(rng.randint(1, attempts)):
+                    sub_id += 1
+                    style = rng.randrange(len(_TEMPLATES))
+                    if rng.random() < copy_rate:
+                        code = _TEMPLATES[c % len(_TEMPLATES)].format(acc="total", i="i")
+                    else:
+                        code = _TEMPLATES[style].format(acc=f"v{rng.randrange(1000)}", i=rng.choice("ijk")) + f"// {user} attempt {a}\n"
+                    self.codes[sub_id] = code
+                    self.submissions.append({
+                        "id": sub_id,
+                        "hacker_username": user,
+                        "challenge": {"name": ch["name"]},
+                        "status": rng.choice(["Accepted", "Wrong Answer"]),
+                        "language": _LANGUAGES[style],
+                        "score": rng.choice([0, 50, 100]),
+                        "created_at": t0 + rng.randrange(0, 3 * 3600),
+                        "time_taken": None,
+                    })
+        # judge_submissions lists newest first
+        self.submissions.sort(key=lambda s: s["id"], reverse=True)
+
+        totals = {}
+        for s in self.submissions:
+            totals[s["hacker_username"]] = totals.get(s["hacker_username"], 0) + s["score"]
+        ranked = sorted(totals.items(), key=lambda kv: -kv[1])
+        self.leaderboard = [{"hacker": u, "score": score, "time_taken": rng.randrange(600, 10800), "rank": r + 1}
+                            for r, (u, score) in enumerate(ranked)]
+
+class MockHackerRankServer:
+    """
+    latency:      seconds added to every response
+    rate_429:     probability of answering 429 instead of the real response
+    retry_after:  Retry-After header value sent with 429s
+    page_cap:     max page size honoured regardless of the requested limit
+    send_total:   include "total" in paginated responses
+    etags:        send ETags and answer matching If-None-Match with 304
+    """
+    def __init__(self, contest, slug="bench-contest", latency=0.0, rate_429=0.0, retry_after=1,
+                 page_cap=100, send_total=True, etags=True, seed=11):
+        self.etags = etags
+        self.contest = contest
+        self.slug = slug
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.page_cap = page_cap
+        self.send_total = send_total
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.sent_429 = 0
+        self.bytes_sent = 0
+        self.httpd = None
+
+    @property
+    def requests(self):
+        return sum(self.counts.values())
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/rest/contests"
+
+    def _page(self, items, query):
+        offset = int(query.get("offset", ["0"])[0])
+        limit = min(int(query.get("limit", ["100"])[0]), self.page_cap)
+        body = {"models": items[offset:offset + limit]}
+        if self.send_total:
+            body["total"] = len(items)
+        return body
+
+    def route(self, path, query):
+        """Returns (status, body dict, endpoint name)."""
+        prefix = f"/rest/contests/{self.slug}/"
+        if not path.startswith(prefix):
+            return 404, {"error": "unknown contest"}, "other"
+        rest = path[len(prefix):].strip("/")
+        if rest == "challenges":
+            return 200, self._page(self.contest.challenges, query), "challenges"
+        if rest == "leaderboard":
+            return 200, self._page(self.contest.leaderboard, query), "leaderboard"
+        if rest == "judge_submissions":
+            return 200, self._page(self.contest.submissions, query), "judge_submissions"
+        if rest.startswith("submissions/"):
+            try:
+                sub_id = int(rest.split("/", 1)[1])
+            except ValueError:
+                return 404, {}, "submissions"
+            code = self.contest.codes.get(sub_id)
+            if code is None:
+                return 404, {}, "submissions"
+            return 200, {"model": {"id": sub_id, "code": code}}, "submissions"
+        return 404, {}, "other"
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                status, body, endpoint = server.route(url.path, parse_qs(url.query))
+                with server.lock:
+                    server.counts[endpoint] = server.counts.get(endpoint, 0) + 1
+                    throttle = server.rng.random() < server.rate_429
+                    if throttle: server.sent_429 += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if throttle:
+                    status, body = 429, {"error": "Too Many Requests"}
+                payload = json.dumps(body).encode("utf-8")
+                etag = f'"{hashlib.md5(payload).hexdigest()}"' if server.etags and status == 200 else None
+                if etag and self.headers.get("If-None-Match") == etag:
+                    status, payload = 304, b""
+                with server.lock:
+                    server.bytes_sent += len(payload)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                if etag:
+                    self.send_header("ETag", etag)
+                if throttle:
+                    self.send_header("Retry-After", str(server.retry_after))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
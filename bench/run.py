@@ -0,0 +1,257 @@
+"""
+Offline benchmark harness.
+
+Runs the full main() flow (twice: cold, then warm caches) and analyze_only.py against a local
+mock HackerRank server and a fake Gemini backend, and stores the measurements as JSON.
+
+Usage:
+    python -m bench.run                         # all scenarios -> bench/results/<timestamp>.json
+    python -m bench.run --scenario small --scenario throttled
+    python -m bench.run --compare bench/results/a.json bench/results/b.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import resource
+import tracemalloc
+import contextlib
+from datetime import datetime
+
+import analyzer
+import analyze_only
+import main as main_script
+from config import Config
+from checkpoint import CrawlCheckpoint
+from bench.mock_server import MockContest, MockHackerRankServer
+from bench.fake_model import FakeGenAI
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+_BASE_CONFIG = {
+    "REQUESTS_PER_SECOND": 200,
+    "DOWNLOAD_WORKERS": 8,
+    "PAGE_WORKERS": 4,
+    "GEMINI_RPM": 6000,
+    "GEMINI_MAX_IN_FLIGHT": 8,
+}
+
+SCENARIOS = {
+    "small": {
+        "contest": {"users": 50},
+        "server": {"latency": 0.005},
+        "model": {"latency": 0.02},
+    },
+    "medium": {
+        "contest": {"users": 400},
+        "server": {"latency": 0.01},
+        "model": {"latency": 0.05},
+    },
+    "throttled": {
+        "contest": {"users": 100},
+        "server": {"latency": 0.005, "rate_429": 0.05, "retry_after": 1},
+        "model": {"latency": 0.02},
+    },
+    "no-total": {
+        "contest": {"users": 100},
+        "server": {"latency": 0.005, "send_total": False, "page_cap": 50},
+        "model": {"latency": 0.02},
+    },
+    "budget": {
+        "contest": {"users": 100},
+        "server": {"latency": 0.005},
+        "model": {"latency": 0.02},
+        "config": {"ANALYSIS_MAX_CALLS": 20, "PARTIAL_REPORT_EVERY": 10},
+    },
+    "many-small": {
+        "contest": {"users": 300, "attempts": 1},
+        "server": {"latency": 0.002},
+        "model": {"latency": 0.2},
+    },
+    "many-small-batched": {
+        "contest": {"users": 300, "attempts": 1},
+        "server": {"latency": 0.002},
+        "model": {"latency": 0.2, "drop_rate": 0.03},
+        "config": {"GEMINI_BATCH_SIZE": 8},
+    },
+    "flaky-llm": {
+        "contest": {"users": 100},
+        "server": {"latency": 0.005},
+        "model": {"latency": 0.05, "quota_rate": 0.1, "failure_rate": 0.02},
+    },
+}
+
+@contextlib.contextmanager
+def _patched(obj, **values):
+    old = {k: getattr(obj, k) for k in values}
+    for k, v in values.items(): setattr(obj, k, v)
+    try:
+        yield
+    finally:
+        for k, v in old.items(): setattr(obj, k, v)
+
+@contextlib.contextmanager
+def _chdir(path):
+    old = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(old)
+
+def _count_files(path):
+    return sum(len(files) for _, _, files in os.walk(path)) if os.path.exists(path) else 0
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024, 1)
+
+def _collected(slug):
+    """Submissions in the store and leaderboard rows in the crawl checkpoint, to compare with what the mock served."""
+    submissions = 0
+    if os.path.exists(Config.STORE_PATH):
+        conn = sqlite3.connect(Config.STORE_PATH)
+        try:
+            submissions = conn.execute("SELECT COUNT(DISTINCT id) FROM submissions WHERE contest = ?", (slug,)).fetchone()[0]
+        finally:
+            conn.close()
+    users = {row.get("username") for row in CrawlCheckpoint(slug).load_leaderboard()}
+    return {"users": len(users), "submissions": submissions}
+
+def _measure(phase, fn, server, genai, output_dir, verbose, trace_memory):
+    requests_before, r429_before = server.requests, server.sent_429
+    bytes_before = server.bytes_sent
+    llm_before = genai.stats()
+    files_before = _count_files(output_dir)
+
+    if trace_memory: tracemalloc.start()
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull:
+        with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(devnull):
+            fn()
+    wall = time.perf_counter() - started
+    traced_peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    if trace_memory: tracemalloc.stop()
+
+    llm = genai.stats()
+    http_requests = server.requests - requests_before
+    return {
+        "phase": phase,
+        "wall_seconds": round(wall, 3),
+        "http_requests": http_requests,
+        "requests_per_second": round(http_requests / wall, 2) if wall else None,
+        "http_429_retries": server.sent_429 - r429_before,
+        "bytes_downloaded": server.bytes_sent - bytes_before,
+        "llm_calls": llm["calls"] - llm_before["calls"],
+        "llm_quota_retries": llm["quota_errors"] - llm_before["quota_errors"],
+        "llm_failures": llm["failures"] - llm_before["failures"],
+        "llm_prompt_tokens": llm["prompt_tokens"] - llm_before["prompt_tokens"],
+        "peak_traced_mb": round(traced_peak / 1024 / 1024, 1) if traced_peak is not None else None,
+        "peak_rss_mb": _peak_rss_mb(),
+        "files_written": _count_files(output_dir) - files_before,
+        "report_written": any(f.startswith("Report_") for f in os.listdir(output_dir)) if os.path.exists(output_dir) else False,
+        "collected": _collected(server.slug),
+    }
+
+def run_scenario(name, spec, verbose=False, trace_memory=True):
+    workdir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    server = MockHackerRankServer(MockContest(**spec.get("contest", {})), **spec.get("server", {})).start()
+    genai = FakeGenAI(**spec.get("model", {}))
+    config = dict(_BASE_CONFIG, **spec.get("config", {}))
+    config.update(
+        CONTEST_SLUG=server.slug,
+        HACKERRANK_COOKIE="bench",
+        HACKERRANK_BASE_URL=server.base_url,
+        GEMINI_API_KEY="bench",
+    )
+    output_dir = os.path.join(workdir, Config.OUTPUT_DIR)
+
+    phases = []
+    try:
+        with _chdir(workdir), _patched(Config, **config), _patched(analyzer, genai=genai):
+            measure = lambda phase, fn: _measure(phase, fn, server, genai, output_dir, verbose, trace_memory)
+            phases.append(measure("main_cold", lambda: main_script.main([])))
+            phases.append(measure("main_warm", lambda: main_script.main([])))
+            phases.append(measure("analyze_only", lambda: analyze_only.main(["--force"])))
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    contest = server.contest
+    size = {
+        "users": len(contest.leaderboard),
+        "challenges": len(contest.challenges),
+        "submissions": len(contest.submissions),
+    }
+    # Collecting less than the mock served is data loss, however fast the run was
+    for phase in phases:
+        phase["complete"] = all(phase["collected"][k] == size[k] for k in phase["collected"])
+    return {
+        "scenario": name,
+        "spec": spec,
+        "contest_size": size,
+        "phases": phases,
+        "ok": all(phase["complete"] for phase in phases),
+    }
+
+def compare(old_path, new_path):
+    with open(old_path, encoding="utf-8") as f: old = json.load(f)
+    with open(new_path, encoding="utf-8") as f: new = json.load(f)
+    old_runs = {(r["scenario"], p["phase"]): p for r in old["runs"] for p in r["phases"]}
+
+    metrics = ("wall_seconds", "http_requests", "http_429_retries", "llm_calls", "peak_traced_mb", "files_written")
+    print(f"{'scenario/phase':<28}" + "".join(f"{m:>22}" for m in metrics))
+    for run in new["runs"]:
+        for phase in run["phases"]:
+            before = old_runs.get((run["scenario"], phase["phase"]))
+            cells = []
+            for m in metrics:
+                value = phase.get(m)
+                prev = before.get(m) if before else None
+                if isinstance(value, (int, float)) and isinstance(prev, (int, float)) and prev:
+                    cells.append(f"{value} ({(value - prev) / prev * 100:+.0f}%)")
+                else:
+                    cells.append(str(value))
+            print(f"{run['scenario'] + '/' + phase['phase']:<28}" + "".join(f"{c:>22}" for c in cells))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks against a mock HackerRank server and fake Gemini.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Run only these scenarios")
+    parser.add_argument("--output", help="Result JSON path (default bench/results/<timestamp>.json)")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Skip Python allocation tracing (faster, RSS only)")
+    parser.add_argument("--verbose", action="store_true", help="Show the tool's own output")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    runs = []
+    for name in args.scenario or list(SCENARIOS):
+        print(f"▶ {name}...")
+        run = run_scenario(name, SCENARIOS[name], verbose=args.verbose, trace_memory=not args.no_tracemalloc)
+        for p in run["phases"]:
+            print(f"  {p['phase']:<14} {p['wall_seconds']:>8.2f}s  {p['http_requests']:>6} req  "
+                  f"{p['http_429_retries']:>4} 429s  {p['llm_calls']:>5} llm  {p['files_written']:>6} files")
+            if not p["complete"]:
+                print(f"  ❌ {p['phase']} collected {p['collected']} of {run['contest_size']}")
+        runs.append(run)
+
+    result = {"created_at": datetime.now().isoformat(timespec="seconds"), "python": sys.version.split()[0], "runs": runs}
+    path = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results saved: {path}")
+    failed = [run["scenario"] for run in runs if not run["ok"]]
+    if failed:
+        print(f"❌ Incomplete collection in: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
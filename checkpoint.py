@@ -0,0 +1,105 @@
+"""
+Crawl checkpoints for resumable, incremental collection.
+
+Per contest, .cache/<slug>/ holds:
+    crawl_state.json   - offsets, completion flags and newest-submission watermark
+    submissions.jsonl  - every submission record collected so far (append-only)
+    leaderboard.jsonl  - leaderboard rows of the crawl in progress
+"""
+import os
+import json
+import threading
+from config import Config
+from records import Submission
+
+def _default_state():
+    return {
+        "submissions": {"offset": 0, "complete": False, "max_id": None, "max_created_at": None},
+        "leaderboard": {"offset": 0, "complete": False},
+    }
+
+def _newer(a, b):
+    # created_at is either an epoch number or an ISO timestamp string
+    try:
+        return a > b
+    except TypeError:
+        return str(a) > str(b)
+
+class CrawlCheckpoint:
+    def __init__(self, slug, base_dir=None):
+        self.dir = os.path.join(base_dir or Config.CHECKPOINT_DIR, slug)
+        os.makedirs(self.dir, exist_ok=True)
+        self.state_path = os.path.join(self.dir, "crawl_state.json")
+        self.submissions_path = os.path.join(self.dir, "submissions.jsonl")
+        self.leaderboard_path = os.path.join(self.dir, "leaderboard.jsonl")
+        self.state = self._load_state()
+        # Leaderboard and submission crawls run in parallel and share this state file
+        self.lock = threading.Lock()
+
+    def _load_state(self):
+        state = _default_state()
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            for key in state:
+                state[key].update(saved.get(key, {}))
+        return state
+
+    def save(self):
+        # Write-then-rename so an interrupted save never corrupts the state
+        with self.lock:
+            tmp = self.state_path + ".tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(tmp, self.state_path)
+
+    def reset(self, key):
+        self.state[key] = _default_state()[key]
+        path = self.submissions_path if key == "submissions" else self.leaderboard_path
+        if os.path.exists(path):
+            os.remove(path)
+        self.save()
+
+    @staticmethod
+    def _iter_jsonl(path):
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line: continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn last line from a crash mid-write
+                    continue
+
+    @staticmethod
+    def _append_jsonl(path, rows):
+        if not rows: return
+        with open(path, 'a', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def iter_submissions(self):
+        """Streams every Submission collected so far (may repeat ids after a resumed crawl)."""
+        for row in self._iter_jsonl(self.submissions_path):
+            yield Submission.from_dict(row)
+
+    def add_submissions(self, records):
+        self._append_jsonl(self.submissions_path, [r.to_dict() for r in records])
+        sub_state = self.state["submissions"]
+        for r in records:
+            sub_id, created = r.id, r.created_at
+            if isinstance(sub_id, int) and (sub_state["max_id"] is None or sub_id > sub_state["max_id"]):
+                sub_state["max_id"] = sub_id
+            if created is not None and (sub_state["max_created_at"] is None or _newer(created, sub_state["max_created_at"])):
+                sub_state["max_created_at"] = created
+
+    def load_leaderboard(self):
+        return list(self._iter_jsonl(self.leaderboard_path))
+
+    def add_leaderboard(self, rows):
+        self._append_jsonl(self.leaderboard_path, rows)
@@ -1,22 +1,58 @@
 import os
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
 from config import Config
+from ratelimit import RateLimiter
+from source_cache import SourceCache
+from checkpoint import CrawlCheckpoint
+from records import Submission
+from metrics import metrics
+
+# Pages whose validators (and parsed body, to answer a 304) are kept in conditional mode;
+# the oldest are evicted first. Watch polls revisit the first delta page and the leaderboard.
+MAX_CONDITIONAL_PAGES = 256
+
+class CollectionError(Exception):
+    """A paginated crawl could not continue; progress is checkpointed for the next run."""
+
+def make_session(contests=1):
+    """One keep-alive pool big enough for every page/download worker of `contests` concurrent crawls."""
+    session = requests.Session()
+    pool_size = (max(Config.PAGE_WORKERS, Config.DOWNLOAD_WORKERS) + 3) * max(1, contests)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(Config.get_headers())
+    return session
 
 class HackerRankCollector:
-    def __init__(self):
-        Config.validate()
+    """
+    Collector for one contest (default CONTEST_SLUG). Batch runs pass the same limiter,
+    source_cache and session to every contest's collector so they share one budget and pool.
+    """
+    def __init__(self, limiter=None, source_cache=None, slug=None, session=None):
+        Config.validate(require_slug=not slug)
         self.headers = Config.get_headers()
-        self.base_url = "https://www.hackerrank.com/rest/contests"
-        self.slug = Config.CONTEST_SLUG
+        self.base_url = Config.HACKERRANK_BASE_URL.rstrip("/")
+        self.slug = slug or Config.CONTEST_SLUG
+        self.limiter = limiter or RateLimiter(Config.REQUESTS_PER_SECOND, name="hackerrank")
+        if source_cache is None and Config.SOURCE_CACHE_PATH:
+            source_cache = SourceCache(Config.SOURCE_CACHE_PATH)
+        self.source_cache = source_cache
+        self.checkpoint = CrawlCheckpoint(self.slug)
+        self.session = session or make_session()
+        # Watch mode: revalidate pages with ETag / Last-Modified instead of downloading them again
+        self.conditional = False
+        self._validators = {}  # url -> (etag, last_modified, parsed body)
         
     def get_challenges(self):
         print("Fetching challenges metadata...")
         url = f"{self.base_url}/{self.slug}/challenges?offset=0&limit=100"
         try:
-            resp = requests.get(url, headers=self.headers)
-            resp.raise_for_status()
-            models = resp.json().get('models', [])
+            models = self._get_page(url, endpoint="challenges").get('models', [])
             # Return map: {"Challenge Name": max_score}
             # Note: HackerRank API field for score might be 'max_score' or 'score' inside challenge model
             return {c.get('name'): c.get('max_score', 0) for c in models}
@@ -24,101 +60,322 @@ class HackerRankCollector:
             print(f"Error fetching challenges: {e}")
             return {}
 
-    def get_all_submissions(self, callback=None):
-        submissions = []
-        offset = 0
-        limit = 100
-        
-        print("Fetching submissions...")
-        while True:
-            url = f"{self.base_url}/{self.slug}/judge_submissions/?offset={offset}&limit={limit}"
+    @staticmethod
+    def _parse_submission(sub):
+        return Submission(
+            id=sub.get("id"),
+            username=sub.get("hacker_username") or sub.get("hacker"),
+            challenge=sub.get("challenge", {}).get("name") or sub.get("challenge_slug"),
+            status=sub.get("status") or sub.get("result"),
+            language=sub.get("language"),
+            score=sub.get("score") or sub.get("display_score", 0),
+            created_at=sub.get("created_at") or sub.get("created_at_epoch"),
+            time_taken=sub.get("time_taken")
+        )
+
+    def _request(self, url, endpoint, headers=None):
+        """session.get, recording latency, status and response size per endpoint."""
+        started = time.perf_counter()
+        try:
+            resp = self.session.get(url, headers=headers)
+        except Exception:
+            metrics.inc("http_errors_total", endpoint=endpoint)
+            raise
+        finally:
+            metrics.observe("http_request_seconds", time.perf_counter() - started, endpoint=endpoint)
+        metrics.inc("http_responses_total", endpoint=endpoint, status=resp.status_code)
+        metrics.inc("http_bytes_total", len(resp.content or b""), endpoint=endpoint)
+        return resp
+
+    def _get_page(self, url, retries=3, endpoint="page"):
+        """GET a paginated endpoint with retries; raises CollectionError once they are used up."""
+        last_error = None
+        cached = self._validators.get(url) if self.conditional else None
+        headers = None
+        if cached:
+            headers = {k: v for k, v in (("If-None-Match", cached[0]), ("If-Modified-Since", cached[1])) if v}
+        for attempt in range(retries):
+            self.limiter.acquire()
             try:
-                resp = requests.get(url, headers=self.headers)
+                resp = self._request(url, endpoint, headers)
+                if resp.status_code == 304 and cached:
+                    return cached[2]
+                if resp.status_code == 429:
+                    wait_time = self._retry_after(resp, (attempt + 1) * 10)
+                    print(f"⚠️ Rate limited (429). Waiting {wait_time:.0f}s...")
+                    self.limiter.pause(wait_time)
+                    metrics.inc("http_retries_total", endpoint=endpoint, reason="429")
+                    last_error = "429 Too Many Requests"
+                    continue
                 resp.raise_for_status()
-                models = resp.json().get('models', [])
-                
-                if not models: break
-                    
-                for sub in models:
-                    submissions.append({
-                        "id": sub.get("id"),
-                        "username": sub.get("hacker_username") or sub.get("hacker"),
-                        "challenge": sub.get("challenge", {}).get("name") or sub.get("challenge_slug"),
-                        "status": sub.get("status") or sub.get("result"),
-                        "language": sub.get("language"),
-                        "score": sub.get("score") or sub.get("display_score", 0),
-                        "created_at": sub.get("created_at") or sub.get("created_at_epoch"),
-                        "time_taken": sub.get("time_taken")
-                    })
-
-                offset += limit
-                if callback: callback(len(submissions))
-                else: print(f"Fetched {len(submissions)}...")
-                time.sleep(Config.REQUEST_DELAY_SECONDS)
-                
+                data = resp.json()
+                if self.conditional:
+                    etag, modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+                    if etag or modified:
+                        self._validators.pop(url, None)
+                        self._validators[url] = (etag, modified, data)
+                        while len(self._validators) > MAX_CONDITIONAL_PAGES:
+                            self._validators.pop(next(iter(self._validators)))
+                return data
             except Exception as e:
-                print(f"Error fetching submissions: {e}")
-                break
-                
-        return submissions
+                last_error = e
+                metrics.inc("http_retries_total", endpoint=endpoint, reason="error")
+                metrics.sleep(1, reason="retry")
+        raise CollectionError(f"{url}: {last_error}")
+
+    def _paginate(self, endpoint, offset, on_page, limit=100, parallel=True):
+        """
+        Walk a paginated endpoint from `offset`.
+        The first page reports `total` and the page size the server actually serves (it may cap
+        `limit`); the remaining offsets are then fetched concurrently, but on_page(offset, models)
+        is always called in offset order and may return False to stop. A page shorter than
+        that size before `total` is reached raises CollectionError instead of leaving a gap.
+        """
+        def fetch(o):
+            return self._get_page(f"{self.base_url}/{self.slug}/{endpoint}?offset={o}&limit={limit}", endpoint=endpoint.strip("/"))
+
+        data = fetch(offset)
+        models = data.get('models', [])
+        if on_page(offset, models) is False or not models: return
+        size = len(models)
+        offset += size
+
+        total = data.get('total')
+        def check(o, models):
+            expected = min(size, total - o) if isinstance(total, int) else 0
+            if len(models) < expected:
+                raise CollectionError(f"{endpoint} page at offset {o} has {len(models)} rows, expected {expected} (total {total})")
+
+        if parallel and isinstance(total, int) and offset < total:
+            offsets = list(range(offset, total, size))
+            with ThreadPoolExecutor(max_workers=max(1, Config.PAGE_WORKERS)) as pool:
+                futures = [pool.submit(fetch, o) for o in offsets]
+                try:
+                    for o, future in zip(offsets, futures):
+                        models = future.result().get('models', [])
+                        check(o, models)
+                        if on_page(o, models) is False or not models: return
+                finally:
+                    for future in futures: future.cancel()
+            offset = offsets[-1] + len(models)
+
+        # Serial tail: anything past the reported total, or everything when there is no total
+        while True:
+            models = fetch(offset).get('models', [])
+            check(offset, models)
+            if on_page(offset, models) is False or not models: return
+            offset += len(models)
+
+    def crawl_submissions(self, on_records, callback=None, batch_size=1000, replay=True):
+        """
+        Collect all judge submissions, checkpointing after every page.
+        An interrupted crawl resumes at its saved offset; once a crawl has completed,
+        later runs only fetch submissions newer than the stored watermark.
+        on_records(list of Submission) receives every record exactly once as soon as it is
+        known: first the ones stored by earlier runs (in batches), then each page's new ones.
+        With replay=False (watch mode, after a completed crawl) stored records are skipped and
+        only the new ones are passed on.
+        Returns the total number of submissions (only the new ones without replay).
+        """
+        limit = 100
+        sub_state = self.checkpoint.state["submissions"]
+        replay = replay or not sub_state["complete"]
+
+        # Only ids are kept in memory; the records themselves are streamed to on_records
+        known = set()
+        batch = []
+        for record in (self.checkpoint.iter_submissions() if replay else ()):
+            if record.id in known: continue
+            known.add(record.id)
+            batch.append(record)
+            if len(batch) >= batch_size:
+                on_records(batch)
+                batch = []
+        if batch: on_records(batch)
+
+        if sub_state["complete"]:
+            # judge_submissions lists newest first: page from the top until we reach the watermark
+            watermark = sub_state["max_id"]
+            marks = (sub_state["max_id"], sub_state["max_created_at"])
+            offset = 0
+            print(f"Fetching submissions newer than #{watermark} ({len(known)} stored)...")
+        else:
+            watermark = None
+            offset = sub_state["offset"]
+            if offset: print(f"Resuming submissions at offset {offset} ({len(known)} stored)...")
+            else: print("Fetching submissions...")
+
+        new_count = 0
+        def on_page(page_offset, models):
+            nonlocal new_count
+            fresh = []
+            reached_watermark = False
+            for sub in models:
+                record = self._parse_submission(sub)
+                if watermark is not None and isinstance(record.id, int) and record.id <= watermark:
+                    reached_watermark = True
+                    # Without replay `known` is empty; everything up to the watermark is stored already
+                    if not replay: continue
+                if record.id in known: continue
+                known.add(record.id)
+                fresh.append(record)
+
+            self.checkpoint.add_submissions(fresh)
+            new_count += len(fresh)
+            if fresh: on_records(fresh)
+
+            if watermark is None:
+                sub_state["offset"] = page_offset + len(models)
+                if not models: sub_state["complete"] = True
+                self.checkpoint.save()
+
+            if models:
+                if callback: callback(len(known))
+                else: print(f"Fetched {len(known)}...")
+            # Incremental runs stop at the first page that overlaps what we already have
+            return not reached_watermark
+
+        try:
+            # Deltas are small and must stop early, so only full crawls fan out
+            self._paginate("judge_submissions/", offset, on_page, limit, parallel=watermark is None)
+        except CollectionError:
+            if watermark is not None:
+                # Delta is incomplete: keep the old watermark so the next run refetches it
+                sub_state["max_id"], sub_state["max_created_at"] = marks
+            self.checkpoint.save()
+            print(f"❌ Submissions crawl interrupted at offset {sub_state['offset']}; rerun to resume.")
+            raise
+
+        # The watermark only moves once the delta is fully collected
+        sub_state["complete"] = True
+        self.checkpoint.save()
+        print(f"Submissions: {new_count} new, {len(known)} total.")
+        return len(known)
+
+    @staticmethod
+    def _retry_after(resp, default):
+        """Seconds to wait from a Retry-After header (delta or HTTP date), else default."""
+        value = resp.headers.get("Retry-After")
+        if not value:
+            return default
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return default
 
     def get_submission_source(self, sub_id):
+        if self.source_cache:
+            cached = self.source_cache.get(self.slug, sub_id)
+            if cached is not None:
+                metrics.inc("source_cache_hits_total")
+                return cached
+
         url = f"{self.base_url}/{self.slug}/submissions/{sub_id}"
         retries = 3
         
         for attempt in range(retries):
-            # Respect configured delay
-            time.sleep(Config.REQUEST_DELAY_SECONDS)
+            # Shared budget across all download workers
+            self.limiter.acquire()
             
             try:
-                resp = requests.get(url, headers=self.headers)
+                resp = self._request(url, "submissions")
                 
                 if resp.status_code == 429:
-                    wait_time = (attempt + 1) * 10 # Aggressive backoff: 10s, 20s, 30s
-                    print(f"⚠️ Rate limited (429). Waiting {wait_time}s...")
-                    time.sleep(wait_time)
+                    wait_time = self._retry_after(resp, (attempt + 1) * 10)
+                    print(f"⚠️ Rate limited (429). Waiting {wait_time:.0f}s...")
+                    # Pause every worker, not just this one
+                    self.limiter.pause(wait_time)
+                    metrics.inc("http_retries_total", endpoint="submissions", reason="429")
                     continue
                 
                 if resp.status_code == 404: 
                     return "// Not found"
                 
                 resp.raise_for_status()
-                return resp.json().get('model', {}).get('code', "// No code")
+                code = resp.json().get('model', {}).get('code', "// No code")
+                # Judged code never changes, so keep it for every later run
+                if self.source_cache:
+                    self.source_cache.put(self.slug, sub_id, code)
+                return code
                 
             except Exception as e:
                 if attempt == retries - 1:
                     return f"// Error: {str(e)}"
-                time.sleep(1) # Small delay on other errors before retry
+                metrics.inc("http_retries_total", endpoint="submissions", reason="error")
+                metrics.sleep(1, reason="retry") # Small delay on other errors before retry
         
         return "// Error: Max retries exceeded"
 
+    def fetch_sources(self, sub_ids, callback=None):
+        """
+        Download many submission sources concurrently.
+        Returns dict {sub_id: code}; callback(sub_id, code) is called as each one finishes.
+        """
+        sources = {}
+        unique_ids = []
+        for s_id in dict.fromkeys(sub_ids):
+            cached = self.source_cache.get(self.slug, s_id) if self.source_cache else None
+            if cached is not None:
+                metrics.inc("source_cache_hits_total")
+                sources[s_id] = cached
+                if callback: callback(s_id, cached)
+            else:
+                unique_ids.append(s_id)
+        if not unique_ids:
+            return sources
+        print(f"{len(sources)} sources cached, downloading {len(unique_ids)}...")
+
+        with ThreadPoolExecutor(max_workers=max(1, Config.DOWNLOAD_WORKERS)) as pool:
+            futures = {pool.submit(self.get_submission_source, s_id): s_id for s_id in unique_ids}
+            for future in as_completed(futures):
+                s_id = futures[future]
+                sources[s_id] = future.result()
+                if callback: callback(s_id, sources[s_id])
+
+        return sources
+
     def get_leaderboard(self):
-        participants = []
-        offset = 0
+        """Collect the leaderboard; an interrupted crawl resumes at its saved offset."""
         limit = 100
+        lb_state = self.checkpoint.state["leaderboard"]
+        if lb_state["complete"]:
+            # Scores change between runs, so a finished leaderboard is always fetched again
+            self.checkpoint.reset("leaderboard")
+            lb_state = self.checkpoint.state["leaderboard"]
 
-        print("Fetching leaderboard...")
-        while True:
-            url = f"{self.base_url}/{self.slug}/leaderboard?offset={offset}&limit={limit}"
-            try:
-                resp = requests.get(url, headers=self.headers)
-                resp.raise_for_status()
-                models = resp.json().get('models', [])
-                if not models: break
-
-                for p in models:
-                     participants.append({
-                        "username": p.get("hacker"),
-                        "score": p.get("score", 0),
-                        "time_taken": p.get("time_taken", 0),
-                        "rank": p.get("rank")
-                     })
-
-                offset += limit
-                print(f"Fetched {len(participants)}...")
-                time.sleep(Config.REQUEST_DELAY_SECONDS)
-            except Exception as e:
-                print(f"Error leaderboard: {e}")
-                break
+        participants = self.checkpoint.load_leaderboard()
+        offset = lb_state["offset"]
+
+        def on_page(page_offset, models):
+            if not models:
+                lb_state["complete"] = True
+                self.checkpoint.save()
+                return
+
+            rows = [{
+                "username": p.get("hacker"),
+                "score": p.get("score", 0),
+                "time_taken": p.get("time_taken", 0),
+                "rank": p.get("rank")
+            } for p in models]
+            participants.extend(rows)
+            self.checkpoint.add_leaderboard(rows)
+
+            lb_state["offset"] = page_offset + len(models)
+            self.checkpoint.save()
+            print(f"Fetched {len(participants)}...")
+
+        if offset: print(f"Resuming leaderboard at offset {offset}...")
+        else: print("Fetching leaderboard...")
+        try:
+            self._paginate("leaderboard", offset, on_page, limit)
+        except CollectionError:
+            self.checkpoint.save()
+            print(f"❌ Leaderboard crawl interrupted at offset {lb_state['offset']}; rerun to resume.")
+            raise
         
         return participants
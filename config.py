@@ -6,10 +6,65 @@ load_dotenv()
 
 class Config:
     CONTEST_SLUG = os.getenv("CONTEST_SLUG")
+    # Batch mode (batch.py): comma-separated contest slugs, processed BATCH_CONTEST_WORKERS at a time
+    CONTEST_SLUGS = [s.strip() for s in os.getenv("CONTEST_SLUGS", "").split(",") if s.strip()]
+    BATCH_CONTEST_WORKERS = int(os.getenv("BATCH_CONTEST_WORKERS", 2))
+    HACKERRANK_BASE_URL = os.getenv("HACKERRANK_BASE_URL", "https://www.hackerrank.com/rest/contests")
     HACKERRANK_COOKIE = os.getenv("HACKERRANK_COOKIE")
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     REQUEST_DELAY_SECONDS = float(os.getenv("REQUEST_DELAY_SECONDS", 2.0))
+    # Shared budget for all download workers (defaults to one request per REQUEST_DELAY_SECONDS)
+    REQUESTS_PER_SECOND = float(os.getenv("REQUESTS_PER_SECOND", 1 / REQUEST_DELAY_SECONDS if REQUEST_DELAY_SECONDS > 0 else 0))
+    DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", 4))
+    # Bounded queue size between streaming pipeline stages (backpressure)
+    PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 200))
+    # Which attempts' sources to download: all, latest, best-scoring or latest+best (per user and challenge)
+    FETCH_POLICY = os.getenv("FETCH_POLICY", "latest+best").strip().lower()
+    # Concurrent page fetches for leaderboard / judge_submissions pagination
+    PAGE_WORKERS = int(os.getenv("PAGE_WORKERS", 4))
     OUTPUT_DIR = "results"
+    # Submission store (SQLite) shared by main.py and analyze_only.py; the text tree is an export of it
+    STORE_PATH = os.getenv("STORE_PATH", os.path.join(OUTPUT_DIR, "submissions.db"))
+    EXPORT_TEXT_TREE = os.getenv("EXPORT_TEXT_TREE", "1").lower() in ("1", "true", "yes")
+    # Crawl checkpoints (offsets, watermarks, collected records) live in <CHECKPOINT_DIR>/<slug>/
+    CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", ".cache")
+    # Persistent submission source cache (set SOURCE_CACHE_PATH empty to disable)
+    SOURCE_CACHE_PATH = os.getenv("SOURCE_CACHE_PATH", os.path.join(".cache", "sources.db"))
+
+    # Gemini throughput: concurrent requests, requests/tokens per minute, retries on quota errors
+    GEMINI_MAX_IN_FLIGHT = int(os.getenv("GEMINI_MAX_IN_FLIGHT", 4))
+    GEMINI_RPM = float(os.getenv("GEMINI_RPM", 15))
+    GEMINI_TPM = float(os.getenv("GEMINI_TPM", 1000000))
+    GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", 5))
+    # Users packed into one Gemini request (within PROMPT_TOKEN_BUDGET); 1 sends one request per user
+    GEMINI_BATCH_SIZE = int(os.getenv("GEMINI_BATCH_SIZE", 1))
+    # Prompt compaction: per-request token budget and per-challenge size cap (0 = no limit)
+    PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 30000))
+    PROMPT_MAX_CHARS_PER_CHALLENGE = int(os.getenv("PROMPT_MAX_CHARS_PER_CHALLENGE", 8000))
+    PROMPT_STRIP_COMMENTS = os.getenv("PROMPT_STRIP_COMMENTS", "1").lower() in ("1", "true", "yes")
+    # AI review cache; FORCE_REANALYZE=1 (or --force) ignores cached reviews
+    REVIEW_CACHE_PATH = os.getenv("REVIEW_CACHE_PATH", os.path.join(".cache", "reviews.db"))
+    FORCE_REANALYZE = os.getenv("FORCE_REANALYZE", "").lower() in ("1", "true", "yes")
+    # AI analysis budget per run (0 = unlimited); review-cache hits do not count
+    ANALYSIS_MAX_CALLS = int(os.getenv("ANALYSIS_MAX_CALLS", 0))
+    ANALYSIS_MAX_TOKENS = int(os.getenv("ANALYSIS_MAX_TOKENS", 0))
+    # Users scoring at most this with no local risk signal are not sent to Gemini (-1 analyzes everyone)
+    ANALYSIS_MIN_SCORE = float(os.getenv("ANALYSIS_MIN_SCORE", -1))
+    # Rewrite results/Report_partial.* every N analyzed users (0 disables)
+    PARTIAL_REPORT_EVERY = int(os.getenv("PARTIAL_REPORT_EVERY", 25))
+    # Minimum winnowed-fingerprint Jaccard similarity to flag two submissions as near-duplicates
+    SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", 0.8))
+    # Cross-contest fingerprint index for matching against earlier contests (set empty to disable)
+    HISTORY_INDEX_PATH = os.getenv("HISTORY_INDEX_PATH", os.path.join(".cache", "fingerprints.db"))
+    # Timeline features this many standard deviations from the contest mean are flagged in the report
+    TIMELINE_Z_THRESHOLD = float(os.getenv("TIMELINE_Z_THRESHOLD", 2.5))
+    # Seconds between polls in watch mode (watch.py)
+    WATCH_INTERVAL_SECONDS = float(os.getenv("WATCH_INTERVAL_SECONDS", 60))
+    # Report outputs written by ExcelReporter (any of txt, csv, xlsx)
+    REPORT_FORMATS = [f.strip().lower() for f in os.getenv("REPORT_FORMATS", "txt,csv,xlsx").split(",") if f.strip()]
+    # Run metrics (results/_metrics.json + _metrics.prom); optionally rewritten every N seconds during a run
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+    METRICS_INTERVAL_SECONDS = float(os.getenv("METRICS_INTERVAL_SECONDS", 0))
 
     @classmethod
     def get_headers(cls):
@@ -20,10 +75,12 @@ class Config:
         }
 
     @classmethod
-    def validate(cls):
+    def validate(cls, require_slug=True):
         errors = []
-        if not cls.CONTEST_SLUG: errors.append("CONTEST_SLUG missing")
+        if require_slug and not cls.CONTEST_SLUG: errors.append("CONTEST_SLUG missing")
         if not cls.HACKERRANK_COOKIE: errors.append("HACKERRANK_COOKIE missing")
+        if cls.FETCH_POLICY not in ("all", "latest", "best-scoring", "latest+best"):
+            errors.append(f"FETCH_POLICY must be all, latest, best-scoring or latest+best (got {cls.FETCH_POLICY!r})")
         
         if errors:
             print(f"❌ Config Errors: {', '.join(errors)}")
@@ -0,0 +1,223 @@
+"""
+Persistent cross-contest fingerprint index (SQLite).
+
+Every analyzed submission is stored as its winnowed fingerprint set plus 16 stable LSH band
+keys, so a new submission is checked against all earlier contests with an indexed bucket
+lookup instead of a scan. A document's best historical match is computed once, when it is
+added, and kept with it; rerunning a contest costs nothing.
+
+CLI: python fingerprint_index.py size
+     python fingerprint_index.py compact [--max-bucket 500]
+     python fingerprint_index.py drop --contest old-contest-slug
+"""
+import os
+import time
+import array
+import sqlite3
+import argparse
+import threading
+from config import Config
+from store import is_real_code
+from similarity import fingerprint, minhash, stable_band_keys, jaccard, MIN_FINGERPRINTS
+
+# Candidates compared exactly per query; very popular buckets (boilerplate) are not worth more
+MAX_CANDIDATES = 500
+
+def _signed(value):
+    """SQLite integers are signed 64-bit."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def _pack(fps):
+    return array.array("Q", sorted(fps)).tobytes()
+
+def _unpack(blob):
+    values = array.array("Q")
+    values.frombytes(blob)
+    return set(values)
+
+def annotate_history(analysis, history):
+    """Add each user's closest earlier-contest match (from match_and_add) to their analysis row."""
+    for user, row in analysis.items():
+        match = history.get(user)
+        row.update(history_similarity=round(match['similarity'] * 100) if match else 0,
+                   history_match=f"{match['username']}@{match['contest']}" if match else '')
+
+class FingerprintIndex:
+    def __init__(self, path=None, threshold=None):
+        self.path = path or Config.HISTORY_INDEX_PATH
+        self.threshold = Config.SIMILARITY_THRESHOLD if threshold is None else threshold
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        # Batch mode has one index connection per contest thread; wait for each other's writes
+        self.conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id INTEGER PRIMARY KEY,
+                contest TEXT NOT NULL,
+                sub_id INTEGER NOT NULL,
+                username TEXT,
+                challenge TEXT,
+                fingerprints BLOB NOT NULL,
+                added_at REAL NOT NULL,
+                match_doc INTEGER,
+                match_similarity REAL,
+                UNIQUE (contest, sub_id)
+            );
+            CREATE TABLE IF NOT EXISTS bands (
+                band INTEGER NOT NULL,
+                key INTEGER NOT NULL,
+                doc_id INTEGER NOT NULL,
+                PRIMARY KEY (band, key, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_docs_contest_user ON docs(contest, username, challenge);
+        """)
+        self.conn.commit()
+
+    def _query(self, fps, keys, contest):
+        """
+        Best (doc_id, similarity) among other contests' documents sharing an LSH band.
+        Only the MAX_CANDIDATES documents sharing the most bands (the likeliest matches) are compared.
+        """
+        placeholders = ",".join("(?, ?)" for _ in keys)
+        params = [v for band, key in keys for v in (band, _signed(key))]
+        rows = self.conn.execute(f"""
+            SELECT d.doc_id, d.fingerprints FROM (
+                SELECT b.doc_id, COUNT(*) AS shared FROM bands b JOIN docs o ON o.doc_id = b.doc_id
+                WHERE (b.band, b.key) IN (VALUES {placeholders}) AND o.contest != ?
+                GROUP BY b.doc_id ORDER BY shared DESC, b.doc_id DESC LIMIT {MAX_CANDIDATES}
+            ) c JOIN docs d ON d.doc_id = c.doc_id
+        """, [*params, contest]).fetchall()
+        best = (None, 0.0)
+        for doc_id, blob in rows:
+            sim = jaccard(fps, _unpack(blob))
+            if sim > best[1]:
+                best = (doc_id, sim)
+        return best if best[1] >= self.threshold else (None, None)
+
+    def match_and_add(self, contest, user_challenges):
+        """
+        Look up each submission in earlier contests, then add it to the index.
+        user_challenges: {user: {challenge: submission dict with id, code, language}}
+        Returns {user: {"contest", "username", "challenge", "similarity"}} with each user's closest
+        historical match (users without one are left out).
+        """
+        matches = {}
+        with self.lock:
+            for user, subs in user_challenges.items():
+                for challenge, sub in subs.items():
+                    code, sub_id = sub.get('code'), sub.get('id')
+                    if sub_id is None or not is_real_code(code): continue
+
+                    row = self.conn.execute(
+                        "SELECT match_doc, match_similarity FROM docs WHERE contest = ? AND sub_id = ?",
+                        (contest, sub_id)
+                    ).fetchone()
+                    if row is None:
+                        fps = fingerprint(code, sub.get('language'))
+                        if len(fps) < MIN_FINGERPRINTS: continue
+                        keys = stable_band_keys(minhash(fps))
+                        row = self._query(fps, keys, contest)
+                        cur = self.conn.execute("""
+                            INSERT INTO docs(contest, sub_id, username, challenge, fingerprints, added_at, match_doc, match_similarity)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        """, (contest, sub_id, user, challenge, _pack(fps), time.time(), *row))
+                        self.conn.executemany(
+                            "INSERT OR IGNORE INTO bands(band, key, doc_id) VALUES (?, ?, ?)",
+                            [(band, _signed(key), cur.lastrowid) for band, key in keys]
+                        )
+
+                    match_doc, sim = row
+                    if match_doc is None or sim <= matches.get(user, {}).get("similarity", 0): continue
+                    other = self.conn.execute(
+                        "SELECT contest, username, challenge FROM docs WHERE doc_id = ?", (match_doc,)
+                    ).fetchone()
+                    if other:
+                        matches[user] = {"contest": other[0], "username": other[1], "challenge": other[2], "similarity": sim}
+            self.conn.commit()
+        return matches
+
+    def size(self):
+        with self.lock:
+            docs = self.conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+            bands = self.conn.execute("SELECT COUNT(*) FROM bands").fetchone()[0]
+            contests = dict(self.conn.execute("SELECT contest, COUNT(*) FROM docs GROUP BY contest ORDER BY contest").fetchall())
+        return {"docs": docs, "bands": bands, "contests": contests,
+                "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0}
+
+    def compact(self, max_bucket=MAX_CANDIDATES):
+        """
+        Shrink the index:
+          - keep only the newest document per (contest, user, challenge); older attempts add little
+          - drop band buckets holding more than max_bucket documents (shared boilerplate, no signal)
+          - VACUUM
+        Returns the number of documents removed.
+        """
+        with self.lock:
+            removed = self.conn.execute("""
+                DELETE FROM docs WHERE doc_id NOT IN (
+                    SELECT MAX(doc_id) FROM docs GROUP BY contest, username, challenge
+                )
+            """).rowcount
+            self.conn.execute("DELETE FROM bands WHERE doc_id NOT IN (SELECT doc_id FROM docs)")
+            self.conn.execute("""
+                DELETE FROM bands WHERE (band, key) IN (
+                    SELECT band, key FROM bands GROUP BY band, key HAVING COUNT(*) > ?
+                )
+            """, (max_bucket,))
+            # Stored matches may point at removed documents
+            self.conn.execute("""
+                UPDATE docs SET match_doc = NULL, match_similarity = NULL
+                WHERE match_doc IS NOT NULL AND match_doc NOT IN (SELECT doc_id FROM docs)
+            """)
+            self.conn.commit()
+            self.conn.execute("VACUUM")
+        return removed
+
+    def drop_contest(self, contest):
+        with self.lock:
+            removed = self.conn.execute("DELETE FROM docs WHERE contest = ?", (contest,)).rowcount
+            self.conn.execute("DELETE FROM bands WHERE doc_id NOT IN (SELECT doc_id FROM docs)")
+            self.conn.execute("""
+                UPDATE docs SET match_doc = NULL, match_similarity = NULL
+                WHERE match_doc IS NOT NULL AND match_doc NOT IN (SELECT doc_id FROM docs)
+            """)
+            self.conn.commit()
+        return removed
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or compact the cross-contest fingerprint index.")
+    parser.add_argument("--path", default=Config.HISTORY_INDEX_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("size", help="Show index size")
+    compact = sub.add_parser("compact", help="Drop old attempts and boilerplate buckets, then VACUUM")
+    compact.add_argument("--max-bucket", type=int, default=MAX_CANDIDATES, help="Drop LSH buckets with more documents than this")
+    drop = sub.add_parser("drop", help="Remove a contest from the index")
+    drop.add_argument("--contest", required=True)
+    args = parser.parse_args(argv)
+
+    if not args.path or not os.path.exists(args.path):
+        print(f"No index at {args.path}")
+        return
+
+    index = FingerprintIndex(args.path)
+    if args.command == "compact":
+        print(f"Removed {index.compact(args.max_bucket)} documents.")
+    elif args.command == "drop":
+        print(f"Removed {index.drop_contest(args.contest)} documents.")
+
+    info = index.size()
+    print(f"Index: {args.path}")
+    print(f"Documents: {info['docs']}, band entries: {info['bands']}, file size: {info['file_bytes'] / 1024 / 1024:.2f} MB")
+    for contest, count in info['contests'].items():
+        print(f"  {contest}: {count}")
+    index.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Download sources that the fetch policy skipped, on demand.
+
+Fills in every unfetched (or failed) attempt for the selected users and/or challenges, then
+rewrites those users' files in the text export.
+
+Usage:
+    python hydrate.py --user alice --user bob
+    python hydrate.py --challenge "Two Sum"
+    python hydrate.py --all [--contest other-slug]
+"""
+import sys
+import argparse
+import tqdm
+from collector import HackerRankCollector
+from organizer import ResultOrganizer
+from config import Config
+from store import SubmissionStore
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Download skipped submission sources for some users or challenges.")
+    parser.add_argument("--contest", help="Contest slug (default: CONTEST_SLUG)")
+    parser.add_argument("--user", action="append", default=[], help="Username to hydrate (repeatable)")
+    parser.add_argument("--challenge", action="append", default=[], help="Challenge name to hydrate (repeatable)")
+    parser.add_argument("--all", action="store_true", help="Hydrate every unfetched submission")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not (args.user or args.challenge or args.all):
+        print("❌ Nothing to hydrate: pass --user, --challenge or --all")
+        sys.exit(1)
+
+    collector = HackerRankCollector(slug=args.contest)
+    slug = collector.slug
+    store = SubmissionStore(Config.STORE_PATH)
+    sub_ids = store.missing_code_ids(slug, usernames=args.user or None, challenges=args.challenge or None)
+    if not sub_ids:
+        print("Nothing to download.")
+        return
+    print(f"Hydrating {len(sub_ids)} submissions of {slug}...")
+
+    with tqdm.tqdm(total=len(sub_ids), desc="Downloading") as bar:
+        def save(sub_id, code):
+            store.set_codes(slug, {sub_id: code})
+            bar.update(1)
+        collector.fetch_sources(sub_ids, callback=save)
+
+    if Config.EXPORT_TEXT_TREE:
+        users = args.user or sorted(store.usernames_of(slug, sub_ids))
+        written = ResultOrganizer(Config.OUTPUT_DIR).export(store, slug, users=users)
+        print(f"Rewrote {written} challenge files for {len(users)} users.")
+    print("Done!")
+
+if __name__ == "__main__":
+    main()
@@ -1,73 +1,151 @@
 import os
-import time
-import tqdm
-from collector import HackerRankCollector
+import sys
+import argparse
+import threading
+from collector import HackerRankCollector, CollectionError
 from organizer import ResultOrganizer
 from reporter import ExcelReporter
 from analyzer import CodeAnalyzer
 from config import Config
+from similarity import SimilarityEngine
+from fingerprint_index import FingerprintIndex, annotate_history
+from timeline import analyze_timeline, annotate_timeline
+from scheduler import PartialReports
+from store import SubmissionStore
+from pipeline import StreamingPipeline
+from metrics import metrics
 
-def main():
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Collect, organize and analyze a HackerRank contest.")
+    parser.add_argument("--force", action="store_true", help="Ignore cached AI reviews and re-analyze every user")
+    return parser.parse_args(argv)
+
+def save_review(organizer, analysis, user, review):
+    """Write a user's review to results/<user>/_ai_review.txt and record it in `analysis`."""
+    if review.get('skipped'):
+        # Keep any earlier review file; only the report row says it was not analyzed this time
+        analysis.setdefault(user, {}).update(cheating_score=0, notes=review.get('overall_summary', ''))
+        return
+    user_dir = os.path.join(organizer.output_dir, organizer.sanitize(user))
+    os.makedirs(user_dir, exist_ok=True)
+    with open(os.path.join(user_dir, '_ai_review.txt'), 'w', encoding='utf-8') as f:
+        f.write(f"Overall Cheating: {review.get('overall_cheating_probability', 0)}%\n")
+        f.write(f"Summary: {review.get('overall_summary', '')}\n")
+        f.write("=" * 50 + "\n\n")
+        for ch in review.get('challenges', []):
+            f.write(f"[{ch.get('challenge_name')}] {ch.get('cheating_probability',0)}% - {ch.get('summary','')}\n")
+
+    prob = review.get('overall_cheating_probability', 0)
+    summary = review.get('overall_summary', '')
+    analysis.setdefault(user, {}).update(cheating_score=prob, notes=summary)
+
+def run_contest(collector, analyzer, store, output_dir, report_name=None, bar_slot=None, fingerprints=None):
+    """
+    Collect, analyze and report one contest into output_dir.
+    bar_slot: progress-bar slot when several contests run at once (batch mode).
+    fingerprints: similarity cache passed on to finish_contest (watch mode).
+    Returns {"leaderboard": [...], "analysis": {user: row}}, or None if collection failed
+    (progress is checkpointed for the next run).
+    """
+    organizer = ResultOrganizer(output_dir)
+    analysis = {}
+
+    # Downloads overlap the crawl; once it ends, users reach the analyzer as soon as their
+    # sources are in the store, highest priority first
+    print(f"Collect, download & analyze {collector.slug}...")
+    partial = PartialReports(output_dir)
+    analysis_lock = threading.Lock()
+    def on_review(user, review):
+        # Called from the analysis workers
+        with analysis_lock:
+            save_review(organizer, analysis, user, review)
+        if not review.get('skipped'):
+            partial.user_done(pipeline.leaderboard, analysis, analysis_lock)
+    pipeline = StreamingPipeline(collector, store, organizer, analyzer, on_review=on_review, bar_slot=bar_slot)
+    try:
+        leaderboard = pipeline.run()
+    except CollectionError as e:
+        print(f"❌ Collection failed: {e}")
+        return None
+
+    finish_contest(store, collector.slug, leaderboard, analysis, output_dir, report_name, fingerprints)
+    partial.discard()
+    return {"leaderboard": leaderboard, "analysis": analysis}
+
+def finish_contest(store, slug, leaderboard, analysis, output_dir, report_name=None, fingerprints=None):
+    """
+    Similarity check over the analyzed attempts, merged into `analysis`, then the report.
+    fingerprints: optional {sub_id: ...} cache reused across calls (see SimilarityEngine).
+    """
+    # Latest attempt per user per challenge, straight from the store index
+    user_challenges = store.analysis_per_user_challenge(slug)
+    for user in user_challenges:
+        analysis.setdefault(user, {'cheating_score': 0, 'notes': ''})
+
+    print("Similarity check...")
+    with metrics.stage("similarity"):
+        engine = SimilarityEngine(cache=fingerprints)
+        for user, subs in user_challenges.items():
+            for ch, sub in subs.items():
+                engine.add(user, ch, sub['code'], sub.get('language'), sub.get('id'))
+        similarity = engine.run()
+    similarity.write_clusters(os.path.join(output_dir, '_similarity_clusters.txt'))
+    print(f"Found {len(similarity.clusters)} similarity clusters.")
+
+    for user, row in analysis.items():
+        match = similarity.users.get(user)
+        row.update(similarity=similarity.user_score(user), similar_to=match['similar_to'] if match else '')
+
+    if Config.HISTORY_INDEX_PATH:
+        with metrics.stage("history"):
+            index = FingerprintIndex(Config.HISTORY_INDEX_PATH)
+            history = index.match_and_add(slug, user_challenges)
+            index.close()
+        print(f"{len(history)} users match submissions from earlier contests.")
+        annotate_history(analysis, history)
+
+    with metrics.stage("timeline"):
+        timeline = analyze_timeline(store, slug)
+    timeline.write_csv(os.path.join(output_dir, '_timeline_features.csv'))
+    print(f"{int(timeline.flagged.any(axis=0).sum())} users have outlying submission timelines.")
+    annotate_timeline(analysis, timeline)
+
+    with metrics.stage("report"):
+        ExcelReporter(output_dir).generate(leaderboard, analysis, name=report_name)
+
+def main(argv=None):
+    args = parse_args(argv)
     print("🚀 Starting Analysis...")
     Config.validate()
-    
+    metrics.reset()
+    metrics.start_periodic(Config.OUTPUT_DIR)
+
     collector = HackerRankCollector()
-    organizer = ResultOrganizer(Config.OUTPUT_DIR)
-    analyzer = CodeAnalyzer()
-    reporter = ExcelReporter(Config.OUTPUT_DIR)
-
-    leaderboard = collector.get_leaderboard()
-    submissions = collector.get_all_submissions()
-    challenges_map = collector.get_challenges()
-    
-    print("Download code & organize...")
-    cache = {} 
-    fetcher = lambda s_id: cache.setdefault(s_id, collector.get_submission_source(s_id))
-    
-    organizer.organize(submissions, fetcher, challenges_map)
-
-    print("AI Analysis...")
-    analysis = {}
-    
-    # Group submissions by user -> challenge, keep best/latest code
-    user_challenges = {}
-    for s in submissions:
-        user, ch = s.get('username'), s.get('challenge')
-        if not user or not ch: continue
-        user_challenges.setdefault(user, {})[ch] = s
-
-    for user, subs in tqdm.tqdm(user_challenges.items(), desc="Analyzing"):
-        # Build code dict for all challenges
-        challenge_codes = {}
-        for ch, sub in subs.items():
-            code = fetcher(sub['id'])
-            if code and len(code.strip()) > 10:
-                challenge_codes[ch] = code
-        
-        if not challenge_codes:
-            analysis[user] = {'cheating_score': 0, 'notes': ''}
-            continue
-
-        # One API call per user
-        review = analyzer.analyze_user(user, challenge_codes)
-        
-        # Save review to user folder
-        user_dir = os.path.join(Config.OUTPUT_DIR, organizer.sanitize(user))
-        os.makedirs(user_dir, exist_ok=True)
-        with open(os.path.join(user_dir, '_ai_review.txt'), 'w', encoding='utf-8') as f:
-            f.write(f"Overall Cheating: {review.get('overall_cheating_probability', 0)}%\n")
-            f.write(f"Summary: {review.get('overall_summary', '')}\n")
-            f.write("=" * 50 + "\n\n")
-            for ch in review.get('challenges', []):
-                f.write(f"[{ch.get('challenge_name')}] {ch.get('cheating_probability',0)}% - {ch.get('summary','')}\n")
-
-        prob = review.get('overall_cheating_probability', 0)
-        summary = review.get('overall_summary', '')
-        analysis[user] = {'cheating_score': prob, 'notes': summary}
-        
-        time.sleep(0.5)
-
-    reporter.generate(leaderboard, analysis)
+    analyzer = CodeAnalyzer(force=args.force or None)
+    store = SubmissionStore(Config.STORE_PATH)
+
+    result = run_contest(collector, analyzer, store, Config.OUTPUT_DIR)
+    if result is None:
+        # Progress is checkpointed; a rerun continues from here instead of reporting partial data
+        metrics.finish(Config.OUTPUT_DIR)
+        return
+
+    usage = analyzer.write_usage(os.path.join(Config.OUTPUT_DIR, '_token_usage.json'))
+    print(f"Gemini tokens: {usage['total_tokens']} over {usage['requests']} requests.")
+    print(f"AI budget used: {analyzer.budget.summary()}")
+    metrics.finish(Config.OUTPUT_DIR)
+    peak = peak_rss_mb()
+    if peak: print(f"Peak memory: {peak:.0f} MB")
     print("Done!")
 
 if __name__ == "__main__":
@@ -0,0 +1,195 @@
+"""
+Lightweight run metrics: counters, latency histograms and stage timers.
+
+Everything is recorded into one process-wide registry (`metrics`) and written at the end of a
+run as results/_metrics.json and results/_metrics.prom (Prometheus text format), optionally
+also every METRICS_INTERVAL_SECONDS while the run is going. With METRICS_ENABLED=0 every
+call returns immediately.
+"""
+import os
+import json
+import time
+import threading
+import contextlib
+from config import Config
+
+PROMETHEUS_PREFIX = "hr_analyzer_"
+# Upper bounds in seconds, shared by every latency histogram
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+class Metrics:
+    def __init__(self, enabled=None):
+        self.enabled = Config.METRICS_ENABLED if enabled is None else enabled
+        self.lock = threading.Lock()
+        self._periodic = None
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+            self.started = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    # --- recording ------------------------------------------------------
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled: return
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled: return
+        key = self._key(name, labels)
+        with self.lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = {"buckets": [0] * len(BUCKETS), "count": 0, "sum": 0.0, "max": 0.0}
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    h["buckets"][i] += 1
+                    break
+            h["count"] += 1
+            h["sum"] += seconds
+            h["max"] = max(h["max"], seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def stage(self, stage):
+        """Time spent in a stage; stages run by several workers add up their busy time."""
+        return self.timer("stage_seconds", stage=stage)
+
+    def sleep(self, seconds, **labels):
+        """time.sleep that is accounted as deliberate waiting (throttling, backoff, retry delay)."""
+        if seconds <= 0: return
+        time.sleep(seconds)
+        self.inc("sleep_seconds_total", seconds, **labels)
+
+    # --- export ---------------------------------------------------------
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {k: dict(v, buckets=list(v["buckets"])) for k, v in self.histograms.items()}
+            started = self.started
+
+        def entry(key):
+            name, labels = key
+            return {"name": name, "labels": dict(labels)}
+
+        result = {"uptime_seconds": round(time.time() - started, 3), "counters": [], "histograms": []}
+        for key in sorted(counters):
+            value = counters[key]
+            result["counters"].append(dict(entry(key), value=round(value, 3) if isinstance(value, float) else value))
+        for key in sorted(histograms):
+            h = histograms[key]
+            result["histograms"].append(dict(
+                entry(key),
+                count=h["count"],
+                sum=round(h["sum"], 3),
+                mean=round(h["sum"] / h["count"], 4) if h["count"] else 0,
+                max=round(h["max"], 3),
+                buckets={str(bound): n for bound, n in zip(BUCKETS, h["buckets"])},
+            ))
+        return result
+
+    @staticmethod
+    def _labels(labels, extra=None):
+        items = list(labels.items()) + (list(extra.items()) if extra else [])
+        if not items: return ""
+        escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+    def to_prometheus(self):
+        snap = self.snapshot()
+        lines = [f"# TYPE {PROMETHEUS_PREFIX}uptime_seconds gauge", f"{PROMETHEUS_PREFIX}uptime_seconds {snap['uptime_seconds']}"]
+        typed = set()
+        for c in snap["counters"]:
+            name = PROMETHEUS_PREFIX + c["name"]
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{self._labels(c['labels'])} {c['value']}")
+        for h in snap["histograms"]:
+            name = PROMETHEUS_PREFIX + h["name"]
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            # Prometheus buckets are cumulative
+            running = 0
+            for bound, n in h["buckets"].items():
+                running += n
+                lines.append(f"{name}_bucket{self._labels(h['labels'], {'le': bound})} {running}")
+            lines.append(f"{name}_bucket{self._labels(h['labels'], {'le': '+Inf'})} {h['count']}")
+            lines.append(f"{name}_sum{self._labels(h['labels'])} {h['sum']}")
+            lines.append(f"{name}_count{self._labels(h['labels'])} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, output_dir):
+        """Write _metrics.json and _metrics.prom into output_dir. Returns the JSON path (None when disabled)."""
+        if not self.enabled: return None
+        os.makedirs(output_dir, exist_ok=True)
+        json_path = os.path.join(output_dir, "_metrics.json")
+        for path, text in ((json_path, json.dumps(self.snapshot(), indent=2)),
+                           (os.path.join(output_dir, "_metrics.prom"), self.to_prometheus())):
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            # Atomic, so a scraper or a periodic dump never sees a half-written file
+            os.replace(tmp, path)
+        return json_path
+
+    def start_periodic(self, output_dir, interval=None):
+        """Rewrite the metrics files every `interval` seconds until stop_periodic()."""
+        interval = Config.METRICS_INTERVAL_SECONDS if interval is None else interval
+        if not self.enabled or interval <= 0 or self._periodic: return
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    self.write(output_dir)
+                except OSError:
+                    pass
+
+        thread = threading.Thread(target=loop, daemon=True)
+        self._periodic = (thread, stop)
+        thread.start()
+
+    def stop_periodic(self):
+        if not self._periodic: return
+        thread, stop = self._periodic
+        stop.set()
+        thread.join()
+        self._periodic = None
+
+    def finish(self, output_dir):
+        """Stop periodic dumps, write the final metrics files and print a one-line summary."""
+        self.stop_periodic()
+        path = self.write(output_dir)
+        if path: print(f"Metrics: {self.summary()} -> {path}")
+
+    def summary(self):
+        """One-line overview for the end of a run."""
+        snap = self.snapshot()
+        total = lambda name: sum(c["value"] for c in snap["counters"] if c["name"] == name)
+        requests = sum(h["count"] for h in snap["histograms"] if h["name"] == "http_request_seconds")
+        llm_calls = sum(h["count"] for h in snap["histograms"] if h["name"] == "llm_request_seconds")
+        return (f"{requests} HTTP requests ({total('http_bytes_total') / 1024 / 1024:.1f} MB), "
+                f"{total('http_retries_total')} retries, {total('sleep_seconds_total'):.0f}s waiting, "
+                f"{llm_calls} Gemini calls")
+
+metrics = Metrics()
@@ -1,5 +1,5 @@
 import os
-import shutil
+from metrics import metrics
 
 class ResultOrganizer:
     def __init__(self, output_dir):
@@ -8,45 +8,44 @@ class ResultOrganizer:
     def sanitize(self, name):
         return "".join([c for c in str(name) if c.isalnum() or c in (' ', '-', '_')]).strip()
 
-    def organize(self, submissions, fetcher, challenges_meta=None):
+    def export(self, store, contest, users=None):
+        """
+        Render the human-readable results/<user>/<challenge>.txt tree from the submission store.
+        users: optional set of usernames to (re)write; defaults to everyone.
+        """
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
 
-        user_subs = {}
-        for sub in submissions:
-            user = sub.get('username')
-            if not user: continue
-            user_subs.setdefault(user, []).append(sub)
-
-        print(f"Organizing {len(user_subs)} users...")
-
-        for user, subs in user_subs.items():
+        challenges_meta = store.challenges(contest)
+        written = 0
+        if users is None:
+            groups = store.iter_user_challenges(contest)
+        else:
+            groups = (g for user in users for g in store.iter_user_challenges(contest, username=user))
+        for user, c_name, c_subs in groups:
             user_dir = os.path.join(self.output_dir, self.sanitize(user))
             os.makedirs(user_dir, exist_ok=True)
-
-            challenge_subs = {}
-            for sub in subs:
-                c_name = sub.get('challenge', 'Unknown')
-                challenge_subs.setdefault(c_name, []).append(sub)
-
-            for c_name, c_subs in challenge_subs.items():
-                c_subs.sort(key=lambda x: x.get('created_at', 0))
-                
-                # Fetch Max Possible Score from metadata
-                possible_max = challenges_meta.get(c_name, 0) if challenges_meta else 0
-                
-                # Calculate User's Best Score
-                try:
-                    user_max = max(float(s.get('score', 0)) for s in c_subs)
-                except:
-                    user_max = 0
-
-                filepath = os.path.join(user_dir, f"{self.sanitize(c_name)}.txt")
-
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(f"Challenge: {c_name}\nUser: {user}\nScore: {user_max} / {possible_max}\n{'='*30}\n\n")
-                    
-                    for sub in c_subs:
-                        f.write(f"### [ID: {sub.get('id')}] Status: {sub.get('status')} | Score: {sub.get('score')} | Time: {sub.get('created_at')}\n")
-                        code = fetcher(sub.get('id'))
-                        f.write(f"{code}\n\n{'-'*30}\n\n")
+            self.write_challenge_file(user_dir, user, c_name, c_subs, challenges_meta.get(c_name, 0))
+            written += 1
+
+        metrics.inc("files_written_total", written)
+        if users is None: print(f"Exported {written} challenge files.")
+        return written
+
+    def write_challenge_file(self, user_dir, user, c_name, c_subs, possible_max=0):
+        # Calculate User's Best Score
+        try:
+            user_max = max(float(s.get('score') or 0) for s in c_subs)
+        except:
+            user_max = 0
+
+        filepath = os.path.join(user_dir, f"{self.sanitize(c_name)}.txt")
+
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(f"Challenge: {c_name}\nUser: {user}\nScore: {user_max} / {possible_max}\n{'='*30}\n\n")
+
+            for sub in c_subs:
+                f.write(f"### [ID: {sub.get('id')}] Status: {sub.get('status')} | Score: {sub.get('score')} | Time: {sub.get('created_at')}\n")
+                code = sub.get('code')
+                if code is None: code = f"// Not fetched (python hydrate.py --user {user})"
+                f.write(f"{code}\n\n{'-'*30}\n\n")
@@ -0,0 +1,260 @@
+"""
+Streaming pipeline: crawl -> download -> export + AI analysis.
+
+    crawl thread      pages of judge_submissions -> store + download queue
+    download workers  fetch sources (shared rate limiter) -> store, while the crawl continues
+    analysis workers  users whose submissions are all downloaded -> text export + Gemini
+                      (several waiting users per request when GEMINI_BATCH_SIZE > 1)
+
+judge_submissions lists the whole contest newest first, so a user's attempt list is only known
+to be complete when the crawl ends: a user may have older attempts on any later page. Downloads
+therefore overlap the crawl, but users reach the analyzer only after it; analysis then overlaps
+the remaining downloads.
+
+Queues are bounded, so a slow stage applies backpressure to the one feeding it. Downloads and
+analysis are both taken in scheduler priority order (leaderboard position once it is known,
+plus timeline risk once the crawl is done), so the users that matter most finish first and a
+user's downloads stay together. Low-value users are exported but not analyzed. Any stage error
+stops every stage and is re-raised by run().
+"""
+import os
+import queue
+import threading
+import tqdm
+from config import Config
+from store import is_real_code
+from metrics import metrics
+from scheduler import AnalysisScheduler, skipped_review
+from timeline import analyze_timeline
+
+_POLL = 0.2
+
+class StreamingPipeline:
+    def __init__(self, collector, store, organizer, analyzer, on_review=None, scheduler=None, bar_slot=None):
+        self.collector = collector
+        self.store = store
+        self.organizer = organizer
+        self.analyzer = analyzer
+        self.on_review = on_review
+        self.scheduler = scheduler or AnalysisScheduler()
+        self.slug = collector.slug
+        # Concurrent pipelines (batch mode) each draw their progress bars on their own two lines
+        self.bar_slot = bar_slot
+
+        size = max(1, Config.PIPELINE_QUEUE_SIZE)
+        self.download_q = queue.PriorityQueue(maxsize=size)
+        self.analysis_q = queue.PriorityQueue(maxsize=size)
+
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.crawl_done = threading.Event()
+        self.dispatch_done = threading.Event()
+        self.errors = []
+
+        self.pending = {}        # user -> downloads still outstanding
+        self.dispatched = set()  # users already handed to the analyzer
+        self.queued = set()      # submission ids already sent to the download queue
+        self.reviews = {}
+        self.leaderboard = []
+        self.challenges_map = {}
+
+    # --- plumbing -------------------------------------------------------
+
+    def _fail(self, e):
+        with self.lock:
+            self.errors.append(e)
+        self.stop.set()
+
+    def _put(self, q, item):
+        """Blocking put that gives up when the pipeline is shutting down."""
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=_POLL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q, finished):
+        """Blocking get; returns None once `finished()` is true and the queue is drained, or on stop."""
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=_POLL)
+            except queue.Empty:
+                if finished(): return None
+        return None
+
+    def _dispatch(self, user):
+        with self.lock:
+            if user in self.dispatched or self.pending.get(user, 0) > 0:
+                return
+            self.dispatched.add(user)
+            self.analysis_bar.total += 1
+            self.analysis_bar.refresh()
+        self._put(self.analysis_q, (self.scheduler.sort_key(user), user))
+
+    # --- stages ---------------------------------------------------------
+
+    def _on_records(self, records):
+        self.store.upsert_submissions(self.slug, records)
+        users = {r.username for r in records if r.username}
+        if Config.FETCH_POLICY == "all":
+            wanted = {r.id: r.username for r in records if r.username and r.id is not None}
+        else:
+            # Picks are re-evaluated as each user's attempts arrive; newest-first paging means
+            # a pick is rarely superseded later, and then it only cost one extra download
+            wanted = self.store.wanted_ids(self.slug, Config.FETCH_POLICY, usernames=users)
+        with self.lock:
+            for user in users: self.pending.setdefault(user, 0)
+            wanted = {sub_id: user for sub_id, user in wanted.items() if sub_id not in self.queued}
+        fetched = self.store.fetched_ids(self.slug, wanted)
+        for sub_id in sorted(wanted):
+            if sub_id in fetched: continue
+            user = wanted[sub_id]
+            with self.lock:
+                self.queued.add(sub_id)
+                self.pending[user] += 1
+                self.download_bar.total += 1
+                self.download_bar.refresh()
+            if not self._put(self.download_q, (self.scheduler.sort_key(user), sub_id, user)):
+                return
+
+    def _crawl(self):
+        try:
+            try:
+                with metrics.stage("crawl"):
+                    self.collector.crawl_submissions(self._on_records, callback=lambda n: None)
+            finally:
+                self.crawl_done.set()
+            # Every attempt time is known now: rank the remaining work by timeline risk too
+            with metrics.stage("timeline"):
+                self.scheduler.add_signals(timeline=analyze_timeline(self.store, self.slug))
+            # Users whose sources were all stored already (or all downloaded during the crawl)
+            for user in sorted(self.pending, key=self.scheduler.sort_key):
+                if self.stop.is_set(): return
+                self._dispatch(user)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self.dispatch_done.set()
+
+    def _download_worker(self):
+        downloads_finished = lambda: self.crawl_done.is_set() and self.download_q.empty()
+        while True:
+            item = self._get(self.download_q, downloads_finished)
+            if item is None: return
+            _, sub_id, user = item
+            try:
+                with metrics.stage("download"):
+                    code = self.collector.get_submission_source(sub_id)
+                with metrics.stage("store"):
+                    self.store.set_codes(self.slug, {sub_id: code})
+            except Exception as e:
+                self._fail(e)
+                return
+            with self.lock:
+                self.pending[user] -= 1
+                self.download_bar.update(1)
+            if self.crawl_done.is_set():
+                self._dispatch(user)
+
+    def _analysis_worker(self, downloads_finished):
+        analysis_finished = lambda: downloads_finished() and self.analysis_q.empty()
+        while True:
+            item = self._get(self.analysis_q, analysis_finished)
+            if item is None: return
+            users = [item[1]]
+            # With batching on, take whoever else is already waiting (highest priority first)
+            while len(users) < Config.GEMINI_BATCH_SIZE:
+                try:
+                    users.append(self.analysis_q.get_nowait()[1])
+                except queue.Empty:
+                    break
+            try:
+                self._process_users(users)
+            except Exception as e:
+                self._fail(e)
+                return
+            with self.lock:
+                self.analysis_bar.update(len(users))
+
+    def _process_users(self, users):
+        if Config.EXPORT_TEXT_TREE:
+            with metrics.stage("export"):
+                self.organizer.export(self.store, self.slug, users=users)
+
+        user_codes, languages = {}, {}
+        for user in users:
+            subs = self.store.analysis_per_user_challenge(self.slug, username=user).get(user, {})
+            challenge_codes = {ch: sub['code'] for ch, sub in subs.items() if is_real_code(sub['code'])}
+            if not challenge_codes:
+                continue
+            if self.scheduler.low_value(user):
+                metrics.inc("llm_skipped_total", reason="low_value")
+                self._save_review(user, skipped_review("low score, no risk signals"))
+            else:
+                user_codes[user] = challenge_codes
+                languages[user] = {ch: subs[ch].get('language') for ch in challenge_codes}
+
+        for batch in self.analyzer.pack_batches(user_codes, languages):
+            with metrics.stage("analysis"):
+                reviews = self.analyzer.analyze_batch(batch, languages, self.slug)
+            for user, review in reviews.items():
+                self._save_review(user, review)
+
+    def _save_review(self, user, review):
+        with self.lock:
+            self.reviews[user] = review
+        # Outside the pipeline lock: a slow callback must not stall the other workers
+        if self.on_review: self.on_review(user, review)
+
+    # --- driver ---------------------------------------------------------
+
+    def run(self):
+        """Returns the leaderboard (reviews and challenges_map are kept on the pipeline). Re-raises the first stage error."""
+        os.makedirs(self.organizer.output_dir, exist_ok=True)
+        position, label = (0, "") if self.bar_slot is None else (2 * self.bar_slot, f"{self.slug}: ")
+        self.download_bar = tqdm.tqdm(total=0, desc=f"{label}Downloading", position=position)
+        self.analysis_bar = tqdm.tqdm(total=0, desc=f"{label}Analyzing", position=position + 1)
+
+        # Challenges, leaderboard and submissions are crawled side by side
+        def challenges():
+            try:
+                with metrics.stage("metadata"):
+                    self.challenges_map = self.collector.get_challenges()
+                    self.store.set_challenges(self.slug, self.challenges_map)
+            except Exception as e:
+                self._fail(e)
+
+        def leaderboard():
+            try:
+                with metrics.stage("metadata"):
+                    self.leaderboard = self.collector.get_leaderboard()
+                    self.scheduler.set_leaderboard(self.leaderboard)
+            except Exception as e:
+                self._fail(e)
+
+        download_threads = [threading.Thread(target=self._download_worker, daemon=True)
+                            for _ in range(max(1, Config.DOWNLOAD_WORKERS))]
+        downloads_finished = lambda: self.dispatch_done.is_set() and not any(t.is_alive() for t in download_threads)
+        analysis_threads = [threading.Thread(target=self._analysis_worker, args=(downloads_finished,), daemon=True)
+                            for _ in range(max(1, Config.GEMINI_MAX_IN_FLIGHT))]
+        threads = [threading.Thread(target=target, daemon=True) for target in (challenges, leaderboard, self._crawl)]
+        threads += download_threads + analysis_threads
+
+        try:
+            for t in threads: t.start()
+            for t in threads:
+                while t.is_alive():
+                    t.join(timeout=_POLL)
+        except KeyboardInterrupt:
+            self.stop.set()
+            for t in threads: t.join()
+            raise
+        finally:
+            self.download_bar.close()
+            self.analysis_bar.close()
+
+        if self.errors:
+            raise self.errors[0]
+        return self.leaderboard
@@ -0,0 +1,60 @@
+"""
+Prompt compaction for CodeAnalyzer.
+
+Shrinks the code part of a prompt before it is sent: comments and excess whitespace are
+removed, repeated include/import lines dropped, identical solutions across challenges sent
+once, and oversized submissions (templates, hardcoded outputs) cut down to head + tail.
+"""
+import re
+from config import Config
+from similarity import strip_comments
+
+_INCLUDE_RE = re.compile(r"^\s*(#include|import |from \S+ import |using namespace )")
+
+def compact_code(code, language=None):
+    # Without a language, '#' vs '//' comments cannot be told apart from Python's floor division
+    # or C's preprocessor, so comments are left in rather than risk deleting real code
+    if Config.PROMPT_STRIP_COMMENTS and language:
+        code = strip_comments(code, language)
+
+    lines = []
+    seen_includes = set()
+    for line in code.replace("\r\n", "\n").split("\n"):
+        line = line.rstrip()
+        if not line.strip():
+            continue
+        if _INCLUDE_RE.match(line):
+            key = line.strip()
+            if key in seen_includes: continue
+            seen_includes.add(key)
+        lines.append(line)
+    return "\n".join(lines)
+
+def truncate_code(code, max_chars):
+    """Keep the head and tail of an outlier submission, marking what was cut."""
+    if max_chars <= 0 or len(code) <= max_chars:
+        return code
+    head = code[:max_chars * 2 // 3]
+    tail = code[-(max_chars // 3):]
+    omitted = len(code) - len(head) - len(tail)
+    return f"{head}\n... [{omitted} chars omitted] ...\n{tail}"
+
+def build_code_sections(challenge_codes, max_chars=None, languages=None):
+    """
+    Returns the compacted "=== Challenge ===" block for a prompt.
+    languages: optional { "Challenge Name": language } used for comment stripping.
+    Identical solutions (after compaction) are sent once and referenced by name afterwards.
+    """
+    if max_chars is None:
+        max_chars = Config.PROMPT_MAX_CHARS_PER_CHALLENGE
+
+    sections = []
+    first_seen = {}
+    for ch_name, code in challenge_codes.items():
+        compact = compact_code(code, (languages or {}).get(ch_name))
+        if compact in first_seen:
+            sections.append(f"=== Challenge: {ch_name} ===\n(identical to Challenge: {first_seen[compact]})\n")
+            continue
+        first_seen[compact] = ch_name
+        sections.append(f"=== Challenge: {ch_name} ===\n{truncate_code(compact, max_chars)}\n")
+    return "\n".join(sections)
@@ -0,0 +1,54 @@
+import time
+import threading
+from metrics import metrics
+
+class RateLimiter:
+    """
+    Thread-safe token bucket shared by all workers.
+    rate: tokens added per second, burst: bucket capacity, name: label for the sleep metrics.
+    """
+    def __init__(self, rate, burst=1, name="default"):
+        self.name = name
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens=1):
+        """
+        Block until `tokens` are available, then consume them. With rate <= 0 there is no
+        token accounting, but a pause() is still waited out.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = self.blocked_until - now
+                reason = "backoff"
+                if wait <= 0 and self.rate <= 0:
+                    return
+                self._refill(now)
+                if wait <= 0:
+                    reason = "throttle"
+                    # Requests larger than the bucket go through once it is full
+                    # and leave it in debt, so they are still paced correctly.
+                    need = min(tokens, self.capacity)
+                    if self.tokens >= need:
+                        self.tokens -= tokens
+                        return
+                    wait = (need - self.tokens) / self.rate
+            metrics.sleep(wait, reason=reason, limiter=self.name)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for `seconds` (e.g. server sent Retry-After)."""
+        with self.lock:
+            until = time.monotonic() + seconds
+            if until > self.blocked_until:
+                self.blocked_until = until
+            self.tokens = 0
@@ -0,0 +1,43 @@
+"""
+Compact submission record.
+
+Large public contests have 100k+ submissions; a dict per submission repeats every key and
+keeps its own copy of usernames, challenge names, statuses and languages. Submission uses
+__slots__ and interns those strings so each distinct value is stored once.
+"""
+import sys
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+def parse_number(value, default=None):
+    """float for anything numeric-looking ("42", 7, "85%"), default for missing or garbage values."""
+    if value is None or value == "":
+        return default
+    try:
+        return float(str(value).rstrip("%"))
+    except (TypeError, ValueError):
+        return default
+
+class Submission:
+    __slots__ = ("id", "username", "challenge", "status", "language", "score", "created_at", "time_taken")
+
+    def __init__(self, id, username, challenge, status=None, language=None, score=0, created_at=None, time_taken=None):
+        self.id = id
+        self.username = _intern(username)
+        self.challenge = _intern(challenge)
+        self.status = _intern(status)
+        self.language = _intern(language)
+        self.score = score
+        self.created_at = created_at
+        self.time_taken = time_taken
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data.get(name) for name in cls.__slots__})
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"Submission(id={self.id!r}, username={self.username!r}, challenge={self.challenge!r})"
@@ -1,41 +1,226 @@
 import os
+import re
+import csv
+import json
+import zipfile
 from datetime import datetime
+from xml.sax.saxutils import escape
+from config import Config
+from records import parse_number
+
+# Stable snapshot/CSV schema: (field, column title). Only ever append new fields at the end.
+COLUMNS = [
+    ("username", "Username"),
+    ("score", "Score"),
+    ("time_taken", "Time"),
+    ("rank", "Rank"),
+    ("cheating_score", "Cheating %"),
+    ("similarity", "Similarity %"),
+    ("similar_to", "Similar To"),
+    ("link", "Link"),
+    ("notes", "AI Notes"),
+    ("history_similarity", "Historical %"),
+    ("history_match", "Historical Match"),
+    ("timeline_risk", "Timeline Risk"),
+    ("timeline_flags", "Timeline Flags"),
+]
+FIELDS = [field for field, _ in COLUMNS]
+
+SNAPSHOT_FILE = "_report_rows.jsonl"
+
+def _plain(value):
+    """Whole numbers without the trailing .0"""
+    return int(value) if isinstance(value, float) and value.is_integer() else value
+
+def sort_key(row):
+    # Score desc, then time asc; rows with missing values go last
+    score, time_taken = parse_number(row.get("score")), parse_number(row.get("time_taken"))
+    return (score is None, -(score or 0), time_taken is None, time_taken or 0, str(row.get("username")))
+
+def build_row(user, notes):
+    username = user.get("username")
+    return {
+        "username": username,
+        "score": _plain(parse_number(user.get("score"))),
+        "time_taken": _plain(parse_number(user.get("time_taken"))),
+        "rank": user.get("rank"),
+        "cheating_score": _plain(parse_number(notes.get("cheating_score", 0))),
+        "similarity": _plain(parse_number(notes.get("similarity", 0))),
+        "similar_to": notes.get("similar_to", "") or "",
+        "link": f"https://www.hackerrank.com/{username}",
+        "notes": notes.get("notes", "") or "",
+        "history_similarity": _plain(parse_number(notes.get("history_similarity", 0))),
+        "history_match": notes.get("history_match", "") or "",
+        "timeline_risk": _plain(parse_number(notes.get("timeline_risk", 0))),
+        "timeline_flags": notes.get("timeline_flags", "") or "",
+    }
+
+def load_snapshot(output_dir):
+    """
+    Latest row per user from the snapshot log, in report order ([] when there is none).
+    The log is append-only; later lines win.
+    """
+    path = os.path.join(output_dir, SNAPSHOT_FILE)
+    if not os.path.exists(path):
+        return []
+    rows = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line: continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue  # torn last line from an interrupted write
+            rows[row.get("username")] = row
+    return sorted(rows.values(), key=sort_key)
 
 class ExcelReporter:
     def __init__(self, output_dir):
         self.output_dir = output_dir
 
-    def generate(self, leaderboard, analysis):
-        data = []
-        for user in leaderboard:
-            username = user.get('username')
-            notes = analysis.get(username, {})
-            
-            data.append({
-                'Username': username,
-                'Score': user.get('score'),
-                'Time': user.get('time_taken'),
-                'Cheating %': f"{notes.get('cheating_score', 0)}%",
-                'AI Notes': notes.get('notes', ''),
-                'Link': f"https://www.hackerrank.com/{username}"
-            })
-
-        # Sort by Score (desc) then Time (asc) without pandas
-        data.sort(key=lambda x: (-float(x['Score']), float(x['Time'])))
-        
-        # Save as Tab-Separated Values (TSV/TXT)
-        filename = f"Report_{datetime.now().strftime('%Y%m%d_%H%M')}.txt"
-        filepath = os.path.join(self.output_dir, filename)
-        
-        # Write to file with tab separation and aligned columns
+    def generate(self, leaderboard, analysis, name=None, snapshot=True):
+        """
+        Update the row snapshot and write the report in every format in REPORT_FORMATS
+        (txt, csv, xlsx). name: fixed file stem to refresh in place (default Report_<timestamp>).
+        snapshot=False writes the files only (used for interim reports).
+        Rows are sorted in memory and every format is rewritten in full; only the snapshot
+        log is incremental.
+        Returns the path of the first report written.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        rows = [build_row(user, analysis.get(user.get("username"), {})) for user in leaderboard]
+        rows.sort(key=sort_key)
+        if snapshot:
+            changed = self.update_snapshot(rows)
+            print(f"Report rows: {len(rows)} ({changed} changed since the last report)")
+
+        stem = os.path.join(self.output_dir, name or f"Report_{datetime.now().strftime('%Y%m%d_%H%M')}")
+        writers = {"txt": self.write_txt, "csv": self.write_csv, "xlsx": self.write_xlsx}
+        paths = []
+        for fmt in Config.REPORT_FORMATS:
+            if fmt in writers:
+                # Written aside and swapped in, so a report open in a viewer is never half-written
+                path = f"{stem}.{fmt}"
+                writers[fmt](rows, f"{stem}.tmp.{fmt}")
+                os.replace(f"{stem}.tmp.{fmt}", path)
+                paths.append(path)
+        for path in paths:
+            print(f"Report saved: {path}")
+        return paths[0] if paths else None
+
+    def update_snapshot(self, rows):
+        """
+        Append only the rows whose score or analysis changed to the snapshot log.
+        The log is rewritten compactly once stale lines outnumber live ones. Returns the change count.
+        """
+        path = os.path.join(self.output_dir, SNAPSHOT_FILE)
+        previous = {row["username"]: row for row in load_snapshot(self.output_dir)}
+        changed = [row for row in rows if {f: previous.get(row["username"], {}).get(f) for f in FIELDS} != row]
+
+        lines = 0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                lines = sum(1 for _ in f)
+        live = len(set(previous) | {row["username"] for row in rows})
+
+        if lines + len(changed) > 2 * max(live, 1):
+            merged = dict(previous)
+            merged.update((row["username"], row) for row in rows)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for row in sorted(merged.values(), key=sort_key):
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            os.replace(tmp, path)
+        elif changed:
+            with open(path, "a", encoding="utf-8") as f:
+                for row in changed:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        return len(changed)
+
+    def write_txt(self, rows, filepath):
+        """Tab-separated, column-aligned text report."""
         with open(filepath, 'w', encoding='utf-8') as f:
             # Header
-            header = f"{'Username':<20}\t{'Score':<10}\t{'Time':<15}\t{'Cheating %':<12}\t{'Link':<50}\t{'AI Notes'}\n"
+            header = f"{'Username':<20}\t{'Score':<10}\t{'Time':<15}\t{'Cheating %':<12}\t{'Similarity %':<12}\t{'Similar To':<20}\t{'Historical Match':<30}\t{'Timeline Risk':<14}\t{'Link':<50}\t{'AI Notes'}\n"
             f.write(header)
             f.write("-" * 150 + "\n")
-            
-            for row in data:
-                line = f"{str(row['Username']):<20}\t{str(row['Score']):<10}\t{str(row['Time']):<15}\t{str(row['Cheating %']):<12}\t{str(row['Link']):<50}\t{str(row['AI Notes'])}\n"
+
+            for row in rows:
+                cells = {k: "" if v is None else v for k, v in row.items()}
+                historical = f"{cells['history_match']} ({cells['history_similarity']}%)" if cells['history_match'] else ""
+                line = f"{str(cells['username']):<20}\t{str(cells['score']):<10}\t{str(cells['time_taken']):<15}\t{str(cells['cheating_score']) + '%':<12}\t{str(cells['similarity']) + '%':<12}\t{str(cells['similar_to']):<20}\t{historical:<30}\t{str(cells['timeline_risk']):<14}\t{str(cells['link']):<50}\t{str(cells['notes'])}\n"
                 f.write(line)
+        return filepath
+
+    def write_csv(self, rows, filepath):
+        """CSV with the snapshot schema as header; opens directly in Excel/Sheets."""
+        with open(filepath, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+        return filepath
+
+    def write_xlsx(self, rows, filepath):
+        """Minimal single-sheet .xlsx written with zipfile; rows are streamed into the sheet."""
+        with zipfile.ZipFile(filepath, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, xml in _XLSX_PARTS.items():
+                zf.writestr(name, xml)
+            with zf.open("xl/worksheets/sheet1.xml", "w") as sheet:
+                sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                            b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+                sheet.write(_xlsx_row(1, [title for _, title in COLUMNS]))
+                for r, row in enumerate(rows, start=2):
+                    sheet.write(_xlsx_row(r, [row.get(field) for field in FIELDS]))
+                sheet.write(b'</sheetData></worksheet>')
+        return filepath
+
+# Characters XML 1.0 does not allow, even escaped
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+def _column(index):
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+def _xlsx_row(r, values):
+    cells = []
+    for c, value in enumerate(values):
+        ref = f"{_column(c)}{r}"
+        if value is None or value == "":
+            continue
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+        else:
+            text = escape(_XML_INVALID.sub("", str(value)))
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{r}">{"".join(cells)}</row>'.encode("utf-8")
 
-        print(f"Report saved: {filepath}")
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Report" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'),
+}
@@ -0,0 +1,62 @@
+"""
+Persistent cache of AI reviews.
+
+Key = hash of (model name, prompt version, username, normalized challenge code map), so a user
+is only sent to Gemini again when their code, the prompt or the model changes.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from config import Config
+
+def normalize_code(code):
+    """Whitespace-only normalization: line endings, trailing spaces, surrounding blank lines."""
+    return "\n".join(line.rstrip() for line in code.replace("\r\n", "\n").strip().split("\n"))
+
+def review_key(model_name, prompt_version, username, challenge_codes):
+    payload = json.dumps({
+        "model": model_name,
+        "prompt": prompt_version,
+        "user": username,
+        "codes": {ch: normalize_code(code) for ch, code in challenge_codes.items()},
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ReviewCache:
+    def __init__(self, path=None):
+        self.path = path or Config.REVIEW_CACHE_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS reviews (
+                key TEXT PRIMARY KEY,
+                username TEXT,
+                review TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT review FROM reviews WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, username, review):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO reviews(key, username, review, created_at) VALUES (?, ?, ?, ?)",
+                (key, username, json.dumps(review, ensure_ascii=False), time.time())
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
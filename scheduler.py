@@ -0,0 +1,155 @@
+"""
+AI analysis scheduling: who gets a Gemini call, in what order, and within what budget.
+
+    priority        leaderboard score (as a fraction of the top score) plus RISK_WEIGHT times the
+                    strongest local risk signal (timeline risk, similarity, historical match)
+    low value       users scoring at most ANALYSIS_MIN_SCORE with no risk signal are not analyzed
+                    (off by default; the streaming pipeline only has the timeline signal by then)
+    budget          at most ANALYSIS_MAX_CALLS Gemini calls / ANALYSIS_MAX_TOKENS prompt tokens
+                    per run (0 = unlimited); review-cache hits are free
+    partial report  results/Report_partial.* rewritten every PARTIAL_REPORT_EVERY analyzed users,
+                    so an aborted or budget-capped run still leaves the top rows behind
+"""
+import os
+import threading
+from contextlib import nullcontext
+from config import Config
+from reporter import ExcelReporter
+from records import parse_number
+from metrics import metrics
+
+# A user with the strongest risk signal ranks like one scoring this much more (fraction of top score)
+RISK_WEIGHT = 0.5
+# Timeline risk (sum of positive z-scores) treated as a full-strength signal
+TIMELINE_RISK_SCALE = 10.0
+
+PARTIAL_REPORT_NAME = "Report_partial"
+
+def skipped_review(reason):
+    """Review placeholder for a user that was deliberately not sent to Gemini (never cached)."""
+    return {"overall_cheating_probability": 0, "overall_summary": f"Not analyzed: {reason}",
+            "challenges": [], "skipped": True}
+
+class AnalysisBudget:
+    """Thread-safe cap on Gemini calls and prompt tokens for one run (0 = unlimited)."""
+    def __init__(self, max_calls=None, max_tokens=None):
+        self.max_calls = Config.ANALYSIS_MAX_CALLS if max_calls is None else max_calls
+        self.max_tokens = Config.ANALYSIS_MAX_TOKENS if max_tokens is None else max_tokens
+        self.calls = 0
+        self.tokens = 0
+        self.lock = threading.Lock()
+
+    @property
+    def exhausted(self):
+        with self.lock:
+            return bool(self.max_calls and self.calls >= self.max_calls) or \
+                   bool(self.max_tokens and self.tokens >= self.max_tokens)
+
+    def reserve(self, tokens):
+        """Claim one call of `tokens` prompt tokens; False when it would exceed the budget."""
+        with self.lock:
+            if self.max_calls and self.calls + 1 > self.max_calls: return False
+            if self.max_tokens and self.tokens + tokens > self.max_tokens: return False
+            self.calls += 1
+            self.tokens += tokens
+            return True
+
+    def summary(self):
+        with self.lock:
+            calls = f"{self.calls}/{self.max_calls}" if self.max_calls else str(self.calls)
+            tokens = f"{self.tokens}/{self.max_tokens}" if self.max_tokens else str(self.tokens)
+        return f"{calls} calls, {tokens} prompt tokens"
+
+class AnalysisScheduler:
+    """
+    Ranks users for analysis from whatever is known so far: the leaderboard once fetched, and
+    local risk signals once computed. Thread-safe; priorities are recomputed on every lookup.
+    """
+    def __init__(self, leaderboard=None, min_score=None):
+        self.min_score = Config.ANALYSIS_MIN_SCORE if min_score is None else min_score
+        self.scores = None   # user -> leaderboard score; None until the leaderboard is known
+        self.top_score = 1.0
+        self.risk = {}       # user -> strongest risk signal in [0, 1]
+        self.lock = threading.Lock()
+        if leaderboard: self.set_leaderboard(leaderboard)
+
+    def set_leaderboard(self, leaderboard):
+        scores = {row.get("username"): parse_number(row.get("score"), 0.0) for row in leaderboard}
+        with self.lock:
+            self.scores = scores
+            self.top_score = max([1.0, *scores.values()])
+
+    def add_signals(self, timeline=None, similarity=None, history=None):
+        """Merge risk signals: a TimelineResult, a SimilarityResult and/or match_and_add() output."""
+        signals = {}
+        def bump(user, value):
+            signals[user] = max(signals.get(user, 0.0), min(1.0, value))
+        if timeline is not None:
+            for user in timeline.users:
+                if timeline.user_flags(user):
+                    bump(str(user), timeline.user_risk(user) / TIMELINE_RISK_SCALE)
+        if similarity is not None:
+            for user in similarity.users:
+                bump(user, similarity.user_score(user) / 100)
+        for user, match in (history or {}).items():
+            bump(user, match["similarity"])
+        with self.lock:
+            for user, value in signals.items():
+                self.risk[user] = max(self.risk.get(user, 0.0), value)
+
+    def priority(self, user):
+        """Higher is analyzed first."""
+        with self.lock:
+            score = (self.scores or {}).get(user, 0.0)
+            return score / self.top_score + RISK_WEIGHT * self.risk.get(user, 0.0)
+
+    def sort_key(self, user):
+        return (-self.priority(user), user)
+
+    def low_value(self, user):
+        """Not worth a call: a known low score and no risk signal (never true before the leaderboard is known)."""
+        with self.lock:
+            if self.scores is None or self.risk.get(user, 0.0) > 0:
+                return False
+            return self.scores.get(user, 0.0) <= self.min_score
+
+    def plan(self, user_codes):
+        """Split {user: codes} into (dict in priority order, [low-value users])."""
+        skipped = [user for user in user_codes if self.low_value(user)]
+        ordered = sorted(set(user_codes) - set(skipped), key=self.sort_key)
+        if skipped: metrics.inc("llm_skipped_total", len(skipped), reason="low_value")
+        return {user: user_codes[user] for user in ordered}, skipped
+
+class PartialReports:
+    """Rewrites results/Report_partial.* every `every` completed users (0 disables)."""
+    def __init__(self, output_dir, every=None):
+        self.output_dir = output_dir
+        self.every = Config.PARTIAL_REPORT_EVERY if every is None else every
+        self.completed = 0
+        self.written = False
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+
+    def user_done(self, leaderboard, analysis, analysis_lock=None):
+        """
+        Count one completed user and write the partial report when due, from a copy of
+        `analysis` taken under `analysis_lock` (the lock its writers hold) so writing never blocks them.
+        The partial report leaves the row snapshot alone.
+        """
+        with self.lock:
+            self.completed += 1
+            if not self.every or self.completed % self.every or not leaderboard:
+                return
+        with self.write_lock:
+            with analysis_lock or nullcontext():
+                rows = {user: dict(row) for user, row in analysis.items()}
+            with metrics.stage("report"):
+                ExcelReporter(self.output_dir).generate(leaderboard, rows, name=PARTIAL_REPORT_NAME, snapshot=False)
+            self.written = True
+
+    def discard(self):
+        """Remove the partial report once the full one is written."""
+        if not self.written: return
+        for fmt in Config.REPORT_FORMATS:
+            path = os.path.join(self.output_dir, f"{PARTIAL_REPORT_NAME}.{fmt}")
+            if os.path.exists(path): os.remove(path)
@@ -0,0 +1,209 @@
+"""
+Offline code-similarity engine for cross-user plagiarism detection.
+
+Pipeline per submission:
+    normalize (strip comments, canonicalize identifiers/literals)
+    -> winnowed k-gram fingerprints
+    -> MinHash signature
+    -> LSH bands, so only submissions sharing a band are ever compared.
+"""
+import re
+import random
+import hashlib
+from config import Config
+from store import is_real_code
+
+KGRAM = 5
+WINDOW = 4
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+MIN_FINGERPRINTS = 5
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1337)  # fixed seed: signatures must be comparable across runs
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+KEYWORDS = frozenset("""
+    auto break case catch char class const continue default delete do double else enum extern
+    final finally float for friend goto if implements import include inline int interface long
+    namespace new operator package private protected public register return short signed sizeof
+    static struct super switch template this throw throws try typedef typename union unsigned
+    using virtual void volatile while bool true false null nullptr string vector map set pair
+    def elif except lambda pass yield with as in is not and or from global nonlocal raise del
+    assert print input range len None True False self let var function fn func go chan defer
+    select type val object when fun match impl mut pub use mod crate loop
+""".split())
+
+_HASH_COMMENT_LANGS = ("python", "pypy", "ruby", "perl", "bash", "r", "julia")
+
+_TOKEN_RE = re.compile(r"""
+    (?P<str>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')
+  | (?P<num>\d+(?:\.\d+)?)
+  | (?P<id>[A-Za-z_]\w*)
+  | (?P<op>[^\s\w])
+""", re.VERBOSE)
+
+def _uses_hash_comments(code, language):
+    if language:
+        return str(language).lower().startswith(_HASH_COMMENT_LANGS)
+    # Unknown language (e.g. read back from text files): C-family code uses '#' for directives
+    return "{" not in code and "#include" not in code
+
+def strip_comments(code, language=None):
+    """Remove comments without touching string literals."""
+    if _uses_hash_comments(code, language):
+        pattern = r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|#[^\n]*'
+    else:
+        pattern = r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|//[^\n]*|/\*.*?\*/'
+    return re.sub(pattern, lambda m: m.group(1) or "", code, flags=re.DOTALL)
+
+def normalize_tokens(code, language=None):
+    """Token stream with identifiers, numbers and strings canonicalized; keywords kept."""
+    tokens = []
+    for m in _TOKEN_RE.finditer(strip_comments(code, language)):
+        kind = m.lastgroup
+        if kind == "id":
+            word = m.group()
+            tokens.append(word if word in KEYWORDS else "V")
+        elif kind == "num":
+            tokens.append("N")
+        elif kind == "str":
+            tokens.append("S")
+        else:
+            tokens.append(m.group())
+    return tokens
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+def winnow(tokens, k=KGRAM, window=WINDOW):
+    """Winnowing: keep the minimum k-gram hash of every window of `window` consecutive hashes."""
+    hashes = [_hash64(" ".join(tokens[i:i + k])) for i in range(len(tokens) - k + 1)]
+    if len(hashes) <= window:
+        return set(hashes)
+    return {min(hashes[i:i + window]) for i in range(len(hashes) - window + 1)}
+
+def fingerprint(code, language=None):
+    return winnow(normalize_tokens(code, language))
+
+def minhash(fingerprints):
+    return [min((a * h + b) % _PRIME for h in fingerprints) for a, b in _PERMS]
+
+def band_keys(signature):
+    """One hashable key per LSH band."""
+    return [(band, hash(tuple(signature[band * ROWS:(band + 1) * ROWS]))) for band in range(BANDS)]
+
+def stable_band_keys(signature):
+    """Like band_keys, but identical across processes (for persistent indexes)."""
+    return [(band, _hash64(",".join(map(str, signature[band * ROWS:(band + 1) * ROWS])))) for band in range(BANDS)]
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class SimilarityEngine:
+    """
+    Collect one submission per (user, challenge), then find near-duplicate pairs per challenge.
+    Usage:
+        engine = SimilarityEngine()
+        engine.add(user, challenge, code, language, sub_id)
+        result = engine.run()
+    cache: optional dict {sub_id: (fingerprints, signature)} kept across runs (watch mode), so
+    judged code, which never changes, is fingerprinted once.
+    """
+    def __init__(self, threshold=None, cache=None):
+        self.threshold = Config.SIMILARITY_THRESHOLD if threshold is None else threshold
+        self.cache = cache
+        self.docs = {}  # challenge -> {user: fingerprint set}
+        self.signatures = {}  # (challenge, user) -> MinHash signature
+
+    def add(self, user, challenge, code, language=None, sub_id=None):
+        if not is_real_code(code):
+            return
+        cached = self.cache.get(sub_id) if self.cache is not None and sub_id is not None else None
+        if cached is None:
+            fps = fingerprint(code, language)
+            cached = (fps, minhash(fps) if len(fps) >= MIN_FINGERPRINTS else None)
+            if self.cache is not None and sub_id is not None:
+                self.cache[sub_id] = cached
+        fps, signature = cached
+        # Tiny solutions look alike no matter who wrote them
+        if signature is None:
+            return
+        self.docs.setdefault(challenge, {})[user] = fps
+        self.signatures[(challenge, user)] = signature
+
+    def _candidate_pairs(self, challenge, user_fps):
+        buckets = {}
+        for user in user_fps:
+            for key in band_keys(self.signatures[(challenge, user)]):
+                buckets.setdefault(key, []).append(user)
+
+        pairs = set()
+        for users in buckets.values():
+            if len(users) < 2: continue
+            for i in range(len(users)):
+                for j in range(i + 1, len(users)):
+                    pairs.add((min(users[i], users[j]), max(users[i], users[j])))
+        return pairs
+
+    def run(self):
+        """
+        Returns SimilarityResult with:
+          pairs:    [(challenge, user_a, user_b, similarity)] above threshold
+          clusters: [{"challenge", "users", "similarity"}] connected groups of similar users
+          users:    {user: {"similarity", "similar_to", "challenge"}} best match per user
+        """
+        result = SimilarityResult()
+        for challenge, user_fps in self.docs.items():
+            parent = {}
+
+            def find(u):
+                while parent.setdefault(u, u) != u:
+                    parent[u] = parent[parent[u]]
+                    u = parent[u]
+                return u
+
+            matched = []
+            for a, b in self._candidate_pairs(challenge, user_fps):
+                sim = jaccard(user_fps[a], user_fps[b])
+                if sim < self.threshold: continue
+                matched.append((a, b, sim))
+                result.pairs.append((challenge, a, b, sim))
+                parent[find(a)] = find(b)
+                for user, other in ((a, b), (b, a)):
+                    current = result.users.get(user)
+                    if current is None or sim > current["similarity"]:
+                        result.users[user] = {"similarity": sim, "similar_to": other, "challenge": challenge}
+
+            groups, best_in_cluster = {}, {}
+            for a, b, sim in matched:
+                root = find(a)
+                groups.setdefault(root, set()).update((a, b))
+                best_in_cluster[root] = max(best_in_cluster.get(root, 0), sim)
+            for root, users in groups.items():
+                result.clusters.append({"challenge": challenge, "users": sorted(users), "similarity": best_in_cluster[root]})
+
+        result.clusters.sort(key=lambda c: (-len(c["users"]), -c["similarity"], c["challenge"]))
+        return result
+
+class SimilarityResult:
+    def __init__(self):
+        self.pairs = []
+        self.clusters = []
+        self.users = {}
+
+    def user_score(self, user):
+        """Max similarity as an integer percentage (0 if no match)."""
+        match = self.users.get(user)
+        return round(match["similarity"] * 100) if match else 0
+
+    def write_clusters(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"Similarity clusters: {len(self.clusters)}\n")
+            f.write("=" * 50 + "\n\n")
+            for c in self.clusters:
+                f.write(f"[{c['challenge']}] {len(c['users'])} users, up to {round(c['similarity'] * 100)}% similar\n")
+                f.write("  " + ", ".join(c["users"]) + "\n\n")
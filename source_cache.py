@@ -0,0 +1,165 @@
+"""
+Persistent submission source cache shared across runs and scripts.
+
+Sources are stored once per content hash (blobs) and indexed by (contest, submission id),
+so identical code submitted many times is kept only once.
+
+Usage:
+    python source_cache.py size
+    python source_cache.py prune [--contest SLUG] [--older-than-days N] [--max-mb N]
+"""
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from config import Config
+from store import PLACEHOLDER_PREFIXES
+
+class SourceCache:
+    def __init__(self, path=None):
+        self.path = path or Config.SOURCE_CACHE_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                code TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS sources (
+                contest TEXT NOT NULL,
+                sub_id TEXT NOT NULL,
+                hash TEXT NOT NULL REFERENCES blobs(hash),
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (contest, sub_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_sources_hash ON sources(hash);
+        """)
+        self.conn.commit()
+
+    @staticmethod
+    def is_cacheable(code):
+        """Only real code is cached; placeholders (store.PLACEHOLDER_PREFIXES) like '// Error' or '// No code' are not."""
+        return isinstance(code, str) and not code.startswith(PLACEHOLDER_PREFIXES)
+
+    def get(self, contest, sub_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT b.code FROM sources s JOIN blobs b ON b.hash = s.hash WHERE s.contest = ? AND s.sub_id = ?",
+                (contest, str(sub_id))
+            ).fetchone()
+        # Placeholders cached by older versions are refetched
+        return row[0] if row and self.is_cacheable(row[0]) else None
+
+    def put(self, contest, sub_id, code):
+        if not self.is_cacheable(code):
+            return False
+        digest = hashlib.sha256(code.encode('utf-8')).hexdigest()
+        with self.lock:
+            self.conn.execute("INSERT OR IGNORE INTO blobs(hash, code) VALUES (?, ?)", (digest, code))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sources(contest, sub_id, hash, fetched_at) VALUES (?, ?, ?, ?)",
+                (contest, str(sub_id), digest, time.time())
+            )
+            self.conn.commit()
+        return True
+
+    def size(self):
+        """Returns dict with entry/blob counts and bytes used."""
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM sources").fetchone()[0]
+            blobs, code_bytes = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(code AS BLOB))), 0) FROM blobs").fetchone()
+            contests = self.conn.execute("SELECT contest, COUNT(*) FROM sources GROUP BY contest ORDER BY contest").fetchall()
+        file_bytes = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return {
+            "entries": entries,
+            "blobs": blobs,
+            "code_bytes": code_bytes,
+            "file_bytes": file_bytes,
+            "contests": dict(contests),
+        }
+
+    def prune(self, contest=None, older_than_days=None, max_bytes=None):
+        """
+        Evict entries by contest and/or age, then oldest-first until code size <= max_bytes.
+        Returns number of evicted entries.
+        """
+        removed = 0
+        with self.lock:
+            if contest:
+                removed += self.conn.execute("DELETE FROM sources WHERE contest = ?", (contest,)).rowcount
+            if older_than_days is not None:
+                cutoff = time.time() - older_than_days * 86400
+                removed += self.conn.execute("DELETE FROM sources WHERE fetched_at < ?", (cutoff,)).rowcount
+            self._drop_orphans()
+
+            if max_bytes is not None:
+                total = self.conn.execute("SELECT COALESCE(SUM(LENGTH(CAST(code AS BLOB))), 0) FROM blobs").fetchone()[0]
+                rows = self.conn.execute("""
+                    SELECT s.contest, s.sub_id, s.hash, LENGTH(CAST(b.code AS BLOB))
+                    FROM sources s JOIN blobs b ON b.hash = s.hash
+                    ORDER BY s.fetched_at
+                """).fetchall()
+                refs = {}
+                for _, _, digest, _ in rows:
+                    refs[digest] = refs.get(digest, 0) + 1
+                for c, sub_id, digest, length in rows:
+                    if total <= max_bytes: break
+                    self.conn.execute("DELETE FROM sources WHERE contest = ? AND sub_id = ?", (c, sub_id))
+                    removed += 1
+                    refs[digest] -= 1
+                    if refs[digest] == 0:
+                        total -= length
+                self._drop_orphans()
+
+            self.conn.commit()
+            self.conn.execute("VACUUM")
+        return removed
+
+    def _drop_orphans(self):
+        self.conn.execute("DELETE FROM blobs WHERE hash NOT IN (SELECT hash FROM sources)")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or prune the submission source cache.")
+    parser.add_argument("--path", default=Config.SOURCE_CACHE_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("size", help="Show cache size")
+    prune = sub.add_parser("prune", help="Evict cached sources")
+    prune.add_argument("--contest", help="Drop all entries for this contest slug")
+    prune.add_argument("--older-than-days", type=float, help="Drop entries fetched before N days ago")
+    prune.add_argument("--max-mb", type=float, help="Evict oldest entries until code fits in N MB")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        print(f"No cache at {args.path}")
+        return
+
+    cache = SourceCache(args.path)
+    if args.command == "prune":
+        if args.contest is None and args.older_than_days is None and args.max_mb is None:
+            print("❌ Nothing to prune: pass --contest, --older-than-days or --max-mb")
+            sys.exit(1)
+        max_bytes = int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None
+        removed = cache.prune(args.contest, args.older_than_days, max_bytes)
+        print(f"Evicted {removed} entries.")
+
+    info = cache.size()
+    print(f"Cache: {args.path}")
+    print(f"Entries: {info['entries']} ({info['blobs']} unique sources)")
+    print(f"Code size: {info['code_bytes'] / 1024 / 1024:.2f} MB, file size: {info['file_bytes'] / 1024 / 1024:.2f} MB")
+    for contest, count in info['contests'].items():
+        print(f"  {contest}: {count}")
+    cache.close()
+
+if __name__ == "__main__":
+    main()
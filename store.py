@@ -0,0 +1,252 @@
+"""
+Packed, indexed submission store (SQLite).
+
+Single interchange format for submissions, challenge metadata and source code, shared by
+main.py, analyze_only.py and the text export. Indexed by (contest, user, challenge, created_at)
+so "latest/best submission per user per challenge" is one query.
+"""
+import os
+import sqlite3
+import threading
+from config import Config
+from records import parse_number
+
+# Placeholders returned by HackerRankCollector.get_submission_source instead of code,
+# plus the one the text export writes for attempts skipped by the fetch policy
+PLACEHOLDER_PREFIXES = ("// Not found", "// Error", "// No code", "// Not fetched")
+
+def is_real_code(code):
+    return bool(code) and not code.startswith(PLACEHOLDER_PREFIXES) and len(code.strip()) > 10
+
+_COLUMNS = ("id", "username", "challenge", "status", "language", "score", "created_at", "time_taken")
+
+# Which attempts' sources to download (Config.FETCH_POLICY)
+FETCH_POLICIES = ("all", "latest", "best-scoring", "latest+best")
+_LATEST = "created_at DESC, id DESC"
+_BEST = "score DESC, created_at DESC, id DESC"
+_POLICY_ORDERS = {"latest": (_LATEST,), "best-scoring": (_BEST,), "latest+best": (_LATEST, _BEST)}
+
+def _chunks(values, size=500):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+class SubmissionStore:
+    def __init__(self, path=None):
+        self.path = path or Config.STORE_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS submissions (
+                contest TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                username TEXT,
+                challenge TEXT,
+                status TEXT,
+                language TEXT,
+                score REAL,
+                created_at,
+                time_taken,
+                code TEXT,
+                PRIMARY KEY (contest, id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_submissions_user_challenge
+                ON submissions(contest, username, challenge, created_at);
+            CREATE TABLE IF NOT EXISTS challenges (
+                contest TEXT NOT NULL,
+                name TEXT NOT NULL,
+                max_score REAL,
+                PRIMARY KEY (contest, name)
+            );
+        """)
+        self.conn.commit()
+
+    def upsert_submissions(self, contest, submissions):
+        """Insert or refresh Submission metadata; stored code is left untouched."""
+        rows = [
+            (contest, s.id, s.username, s.challenge, s.status,
+             s.language, parse_number(s.score, 0.0), s.created_at, s.time_taken)
+            for s in submissions if s.id is not None
+        ]
+        with self.lock:
+            self.conn.executemany("""
+                INSERT INTO submissions(contest, id, username, challenge, status, language, score, created_at, time_taken)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(contest, id) DO UPDATE SET
+                    username = excluded.username, challenge = excluded.challenge, status = excluded.status,
+                    language = excluded.language, score = excluded.score, created_at = excluded.created_at,
+                    time_taken = excluded.time_taken
+            """, rows)
+            self.conn.commit()
+        return len(rows)
+
+    def set_codes(self, contest, codes):
+        """codes: dict {submission id: source}"""
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE submissions SET code = ? WHERE contest = ? AND id = ?",
+                [(code, contest, sub_id) for sub_id, code in codes.items()]
+            )
+            self.conn.commit()
+
+    def missing_code_ids(self, contest, usernames=None, challenges=None):
+        """Submissions whose source was never fetched or failed to download, optionally for some users/challenges."""
+        filters, params = "", [contest]
+        if usernames:
+            filters += f" AND username IN ({','.join('?' * len(usernames))})"
+            params += list(usernames)
+        if challenges:
+            filters += f" AND challenge IN ({','.join('?' * len(challenges))})"
+            params += list(challenges)
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT id FROM submissions WHERE contest = ? AND (code IS NULL OR code LIKE '// Error%'){filters} ORDER BY id",
+                params
+            ).fetchall()
+        return [r["id"] for r in rows]
+
+    def wanted_ids(self, contest, policy, usernames=None):
+        """
+        {submission id: username} for the attempts whose source `policy` needs, among what is
+        stored so far; usernames limits the pick to those users.
+        """
+        if policy not in FETCH_POLICIES:
+            raise ValueError(f"Unknown fetch policy {policy!r} (expected one of {', '.join(FETCH_POLICIES)})")
+        groups = _chunks(usernames) if usernames is not None else [None]
+        wanted = {}
+        with self.lock:
+            for users in groups:
+                user_filter = f"AND username IN ({','.join('?' * len(users))})" if users else "AND username IS NOT NULL"
+                params = (contest, *users) if users else (contest,)
+                if policy == "all":
+                    queries = [f"SELECT id, username FROM submissions WHERE contest = ? {user_filter}"]
+                else:
+                    queries = [f"""
+                        SELECT id, username FROM (
+                            SELECT id, username, ROW_NUMBER() OVER (
+                                PARTITION BY username, challenge ORDER BY {order_by}
+                            ) AS rn
+                            FROM submissions
+                            WHERE contest = ? AND challenge IS NOT NULL {user_filter}
+                        ) WHERE rn = 1
+                    """ for order_by in _POLICY_ORDERS[policy]]
+                for query in queries:
+                    wanted.update((r["id"], r["username"]) for r in self.conn.execute(query, params))
+        return wanted
+
+    def set_challenges(self, contest, challenges_map):
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO challenges(contest, name, max_score) VALUES (?, ?, ?)",
+                [(contest, name, max_score) for name, max_score in challenges_map.items()]
+            )
+            self.conn.commit()
+
+    def challenges(self, contest):
+        with self.lock:
+            rows = self.conn.execute("SELECT name, max_score FROM challenges WHERE contest = ?", (contest,)).fetchall()
+        return {r["name"]: r["max_score"] for r in rows}
+
+    def _pick_per_user_challenge(self, contest, order_by, with_code, username=None):
+        code_col = ", code" if with_code else ""
+        user_filter = "AND username = ?" if username is not None else ""
+        params = (contest, username) if username is not None else (contest,)
+        with self.lock:
+            rows = self.conn.execute(f"""
+                SELECT {', '.join(_COLUMNS)}{code_col} FROM (
+                    SELECT *, ROW_NUMBER() OVER (
+                        PARTITION BY username, challenge ORDER BY {order_by}
+                    ) AS rn
+                    FROM submissions
+                    WHERE contest = ? AND username IS NOT NULL AND challenge IS NOT NULL {user_filter}
+                ) WHERE rn = 1
+                ORDER BY username, challenge
+            """, params).fetchall()
+        picked = {}
+        for r in rows:
+            picked.setdefault(r["username"], {})[r["challenge"]] = dict(r)
+        return picked
+
+    def latest_per_user_challenge(self, contest, with_code=True, username=None):
+        """{user: {challenge: submission dict}} for each user's most recent attempt."""
+        return self._pick_per_user_challenge(contest, _LATEST, with_code, username)
+
+    def best_per_user_challenge(self, contest, with_code=True, username=None):
+        """{user: {challenge: submission dict}} for each user's highest-scoring (then latest) attempt."""
+        return self._pick_per_user_challenge(contest, _BEST, with_code, username)
+
+    def analysis_per_user_challenge(self, contest, username=None):
+        """The attempt analysis looks at: the best one under the best-scoring fetch policy, else the latest."""
+        if Config.FETCH_POLICY == "best-scoring":
+            return self.best_per_user_challenge(contest, username=username)
+        return self.latest_per_user_challenge(contest, username=username)
+
+    def iter_user_challenges(self, contest, username=None):
+        """Yields (user, challenge, [submission dicts oldest first]) in one indexed scan."""
+        user_filter = "AND username = ?" if username is not None else "AND username IS NOT NULL"
+        params = (contest, username) if username is not None else (contest,)
+        with self.lock:
+            rows = self.conn.execute(f"""
+                SELECT {', '.join(_COLUMNS)}, code FROM submissions
+                WHERE contest = ? {user_filter}
+                ORDER BY username, challenge, created_at, id
+            """, params).fetchall()
+
+        current, group = None, []
+        for r in rows:
+            key = (r["username"], r["challenge"] or "Unknown")
+            if key != current and group:
+                yield current[0], current[1], group
+                group = []
+            current = key
+            group.append(dict(r))
+        if group:
+            yield current[0], current[1], group
+
+    def timeline_rows(self, contest):
+        """(username, challenge, score, created_at) for every submission, for timeline analytics."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT username, challenge, score, created_at FROM submissions "
+                "WHERE contest = ? AND username IS NOT NULL AND challenge IS NOT NULL",
+                (contest,)
+            ).fetchall()
+
+    def fetched_ids(self, contest, sub_ids):
+        """Subset of sub_ids whose source is already stored (anything but missing or '// Error')."""
+        fetched = set()
+        with self.lock:
+            for chunk in _chunks(sub_ids):
+                rows = self.conn.execute(
+                    f"SELECT id FROM submissions WHERE contest = ? AND id IN ({','.join('?' * len(chunk))}) "
+                    "AND code IS NOT NULL AND code NOT LIKE '// Error%'",
+                    (contest, *chunk)
+                ).fetchall()
+                fetched.update(r["id"] for r in rows)
+        return fetched
+
+    def usernames_of(self, contest, sub_ids):
+        """Distinct usernames owning the given submissions."""
+        users = set()
+        with self.lock:
+            for chunk in _chunks(sub_ids):
+                rows = self.conn.execute(
+                    f"SELECT DISTINCT username FROM submissions WHERE contest = ? AND id IN ({','.join('?' * len(chunk))})",
+                    (contest, *chunk)
+                ).fetchall()
+                users.update(r["username"] for r in rows if r["username"])
+        return users
+
+    def has_contest(self, contest):
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM submissions WHERE contest = ? LIMIT 1", (contest,)).fetchone()
+        return row is not None
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
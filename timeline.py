@@ -0,0 +1,180 @@
+"""
+Submission-timeline analytics: a cheap, pre-LLM risk signal.
+
+Per-user behavioral features are computed for every user in one vectorized NumPy pass over
+the contest's submissions, then compared with the contest population as z-scores:
+
+    first_solve_minutes   contest start -> first full-score solve (low = suspicious)
+    mean_gap_minutes      average time between consecutive attempts (low = suspicious)
+    first_try_perfect     challenges solved with full score on the very first attempt
+    burst_solves          most challenges first-solved within BURST_WINDOW_MINUTES
+    max_score_jump        largest score increase between consecutive attempts (fraction of max)
+"""
+import csv
+import math
+from datetime import datetime
+import numpy as np
+from config import Config
+from records import parse_number
+
+BURST_WINDOW_MINUTES = 10
+
+# (feature, sign, flag label): sign -1 means small values are the suspicious ones
+FEATURES = [
+    ("first_solve_minutes", -1, "fast first solve"),
+    ("mean_gap_minutes", -1, "rapid-fire attempts"),
+    ("first_try_perfect", 1, "many first-try perfect solves"),
+    ("burst_solves", 1, "burst solving"),
+    ("max_score_jump", 1, "score jumps"),
+]
+
+def _epoch(value):
+    """created_at is an epoch number or an ISO timestamp; NaN when unparseable."""
+    if value is None or value == "":
+        return math.nan
+    number = parse_number(value)
+    if number is not None:
+        return number
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return math.nan
+
+def _segment_starts(keys):
+    """Indices where a new run of equal keys begins (keys sorted)."""
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=int)
+
+def compute_features(rows, max_scores=None):
+    """
+    rows: iterable of (username, challenge, score, created_at), in any order.
+    max_scores: {challenge: max score}; without one, a challenge's best observed score counts as full.
+    Returns (users array, {feature: float array per user}).
+    """
+    rows = list(rows)
+    if not rows:
+        return np.array([], dtype=object), {name: np.array([]) for name, _, _ in FEATURES}
+    users, challenges, scores, times = zip(*rows)
+    user_names, user_idx = np.unique(np.array(users, dtype=object).astype(str), return_inverse=True)
+    ch_names, ch_idx = np.unique(np.array(challenges, dtype=object).astype(str), return_inverse=True)
+    score = np.array([float(s) if s is not None else 0.0 for s in scores])
+    t = np.array([_epoch(v) for v in times])
+    n_users = len(user_names)
+
+    # Everything below relies on (user, challenge, time) order
+    order = np.lexsort((np.where(np.isnan(t), np.inf, t), ch_idx, user_idx))
+    user_idx, ch_idx, score, t = user_idx[order], ch_idx[order], score[order], t[order]
+
+    # Full score per challenge: metadata when available, else best observed
+    best_seen = np.zeros(len(ch_names))
+    np.maximum.at(best_seen, ch_idx, score)
+    meta = np.array([float((max_scores or {}).get(c) or 0) for c in ch_names])
+    full = np.where(meta > 0, meta, best_seen)
+    perfect = (score >= full[ch_idx]) & (full[ch_idx] > 0)
+
+    start = np.nanmin(t) if np.isfinite(t).any() else math.nan
+
+    counts = np.bincount(user_idx, minlength=n_users).astype(float)
+    first_t = np.full(n_users, np.inf)
+    last_t = np.full(n_users, -np.inf)
+    finite = np.isfinite(t)
+    np.minimum.at(first_t, user_idx[finite], t[finite])
+    np.maximum.at(last_t, user_idx[finite], t[finite])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_gap = np.where(counts > 1, (last_t - first_t) / (counts - 1) / 60, np.nan)
+
+    solve_t = np.full(n_users, np.inf)
+    np.minimum.at(solve_t, user_idx[perfect & finite], t[perfect & finite])
+    first_solve = np.where(np.isfinite(solve_t), (solve_t - start) / 60, np.nan)
+
+    # First attempt of every (user, challenge) group, and consecutive score jumps within groups
+    pair = user_idx * len(ch_names) + ch_idx
+    group_starts = _segment_starts(pair)
+    first_try_perfect = np.bincount(user_idx[group_starts], weights=perfect[group_starts], minlength=n_users)
+    same_group = np.r_[False, pair[1:] == pair[:-1]]
+    jumps = np.where(same_group, np.r_[0.0, np.diff(score)], 0.0) / np.maximum(full[ch_idx], 1)
+    max_jump = np.zeros(n_users)
+    np.maximum.at(max_jump, user_idx, jumps)
+
+    # Burst: first full-score time per (user, challenge), then the most of them inside one window
+    solved_at = np.full(len(pair), np.inf)
+    solved_at[perfect & finite] = t[perfect & finite]
+    group_solve = np.minimum.reduceat(solved_at, group_starts) if len(group_starts) else np.array([])
+    group_user = user_idx[group_starts]
+    ok = np.isfinite(group_solve)
+    su, st = group_user[ok], group_solve[ok]
+    order = np.lexsort((st, su))
+    su, st = su[order], st[order]
+    burst = np.zeros(n_users)
+    if len(st):
+        # Per-user offsets make one global searchsorted respect user boundaries
+        span = (np.nanmax(st) - np.nanmin(st)) + BURST_WINDOW_MINUTES * 60 + 1
+        key = su * span + (st - np.nanmin(st))
+        window_end = np.searchsorted(key, key + BURST_WINDOW_MINUTES * 60, side="right")
+        np.maximum.at(burst, su, window_end - np.arange(len(key)))
+
+    features = {
+        "first_solve_minutes": first_solve,
+        "mean_gap_minutes": mean_gap,
+        "first_try_perfect": first_try_perfect,
+        "burst_solves": burst,
+        "max_score_jump": max_jump,
+    }
+    return user_names, features
+
+def zscores(values, sign=1):
+    """Signed z-scores against the users that have the feature; 0 where it is missing."""
+    ok = np.isfinite(values)
+    z = np.zeros(len(values))
+    if ok.sum() < 2:
+        return z
+    std = values[ok].std()
+    if std > 0:
+        z[ok] = sign * (values[ok] - values[ok].mean()) / std
+    return z
+
+class TimelineResult:
+    def __init__(self, users, features, threshold):
+        self.users = users
+        self.features = features
+        self.z = {name: zscores(features[name], sign) for name, sign, _ in FEATURES}
+        stacked = np.vstack([self.z[name] for name, _, _ in FEATURES]) if len(users) else np.zeros((len(FEATURES), 0))
+        # Risk: sum of the positive (suspicious-direction) z-scores
+        self.risk = np.clip(stacked, 0, None).sum(axis=0)
+        self.flagged = stacked > threshold
+        self.index = {user: i for i, user in enumerate(users)}
+
+    def user_risk(self, user):
+        i = self.index.get(user)
+        return round(float(self.risk[i]), 2) if i is not None else 0
+
+    def user_flags(self, user):
+        i = self.index.get(user)
+        if i is None: return []
+        return [label for (name, _, label), hit in zip(FEATURES, self.flagged[:, i]) if hit]
+
+    def ranked_users(self):
+        """Users by descending risk."""
+        return [self.users[i] for i in np.argsort(-self.risk, kind="stable")]
+
+    def write_csv(self, path):
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["username", "risk", "flags"] + [name for name, _, _ in FEATURES]
+                            + [f"{name}_z" for name, _, _ in FEATURES])
+            for user in self.ranked_users():
+                i = self.index[user]
+                values = [None if not np.isfinite(self.features[name][i]) else round(float(self.features[name][i]), 2)
+                          for name, _, _ in FEATURES]
+                zs = [round(float(self.z[name][i]), 2) for name, _, _ in FEATURES]
+                writer.writerow([user, self.user_risk(user), "; ".join(self.user_flags(user))] + values + zs)
+
+def analyze_timeline(store, contest, threshold=None):
+    """Compute timeline features for every user in the contest. Returns a TimelineResult."""
+    threshold = Config.TIMELINE_Z_THRESHOLD if threshold is None else threshold
+    users, features = compute_features(store.timeline_rows(contest), store.challenges(contest))
+    return TimelineResult(users, features, threshold)
+
+def annotate_timeline(analysis, timeline):
+    """Add each user's risk score and flags to their analysis row."""
+    for user, row in analysis.items():
+        row.update(timeline_risk=timeline.user_risk(user), timeline_flags=", ".join(timeline.user_flags(user)))
@@ -0,0 +1,131 @@
+"""
+Live contest watch mode.
+
+Runs one full collection first, then polls every WATCH_INTERVAL_SECONDS. Each poll:
+  - fetches only submissions newer than the watermark (pages revalidated with ETag /
+    If-Modified-Since where the server supports it)
+  - downloads sources for the new attempts the fetch policy wants and rewrites those users' files
+  - re-analyzes the affected users (unchanged code is served from the review cache)
+  - refetches the leaderboard and refreshes results/Report_live.* in place
+A poll without new submissions costs a single request. A poll with new submissions still costs
+one request per leaderboard page unless the server answers 304, and re-runs the similarity,
+history and timeline checks and the report over the whole contest; only fingerprinting is
+limited to the new submissions (fingerprints are cached by submission id).
+
+Usage: python watch.py [--interval SECONDS] [--polls N] [--force]
+"""
+import time
+import argparse
+from collector import HackerRankCollector, CollectionError
+from organizer import ResultOrganizer
+from analyzer import CodeAnalyzer
+from config import Config
+from store import SubmissionStore, is_real_code
+from metrics import metrics
+from main import run_contest, finish_contest, save_review
+
+REPORT_NAME = "Report_live"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Watch a running HackerRank contest and keep the report up to date.")
+    parser.add_argument("--interval", type=float, default=None, help="Seconds between polls (default: WATCH_INTERVAL_SECONDS)")
+    parser.add_argument("--polls", type=int, default=None, help="Stop after N polls (default: run until Ctrl+C)")
+    parser.add_argument("--force", action="store_true", help="Ignore cached AI reviews on the first pass")
+    return parser.parse_args(argv)
+
+class ContestWatcher:
+    def __init__(self, collector, analyzer, store, output_dir):
+        self.collector = collector
+        self.analyzer = analyzer
+        self.store = store
+        self.output_dir = output_dir
+        self.slug = collector.slug
+        self.organizer = ResultOrganizer(output_dir)
+        self.leaderboard = []
+        self.analysis = {}
+        self.fingerprints = {}  # sub_id -> similarity fingerprints, reused by every poll
+
+    def start(self):
+        """Full collection and analysis; returns False if collection failed."""
+        result = run_contest(self.collector, self.analyzer, self.store, self.output_dir, report_name=REPORT_NAME,
+                             fingerprints=self.fingerprints)
+        if result is None: return False
+        self.leaderboard, self.analysis = result["leaderboard"], result["analysis"]
+        # Only the pages polls revisit are worth revalidating; the initial full crawl keeps nothing
+        self.collector.conditional = True
+        return True
+
+    def poll(self):
+        """Process everything submitted since the last poll. Returns the number of new submissions."""
+        new = []
+        self.collector.crawl_submissions(new.extend, callback=lambda n: None, replay=False)
+        if not new:
+            return 0
+        self.store.upsert_submissions(self.slug, new)
+        users = sorted({r.username for r in new if r.username})
+
+        # Sources for the new attempts the fetch policy wants (old picks are already stored)
+        if Config.FETCH_POLICY == "all":
+            wanted = [r.id for r in new if r.id is not None]
+        else:
+            wanted = list(self.store.wanted_ids(self.slug, Config.FETCH_POLICY, usernames=users))
+        fetched = self.store.fetched_ids(self.slug, wanted)
+        missing = [sub_id for sub_id in wanted if sub_id not in fetched]
+        if missing:
+            self.collector.fetch_sources(missing, callback=lambda sub_id, code: self.store.set_codes(self.slug, {sub_id: code}))
+
+        if Config.EXPORT_TEXT_TREE:
+            self.organizer.export(self.store, self.slug, users=users)
+
+        user_codes, languages = {}, {}
+        for user in users:
+            subs = self.store.analysis_per_user_challenge(self.slug, username=user).get(user, {})
+            codes = {ch: sub['code'] for ch, sub in subs.items() if is_real_code(sub['code'])}
+            if codes:
+                user_codes[user] = codes
+                languages[user] = {ch: subs[ch].get('language') for ch in codes}
+        # Users whose analyzed code did not change are review-cache hits, not Gemini calls
+        self.analyzer.analyze_many(user_codes, on_result=lambda user, review: save_review(self.organizer, self.analysis, user, review),
+                                   desc="Re-analyzing", languages=languages, contest=self.slug)
+
+        self.leaderboard = self.collector.get_leaderboard()
+        finish_contest(self.store, self.slug, self.leaderboard, self.analysis, self.output_dir, report_name=REPORT_NAME,
+                       fingerprints=self.fingerprints)
+        return len(new)
+
+def main(argv=None):
+    args = parse_args(argv)
+    interval = args.interval if args.interval is not None else Config.WATCH_INTERVAL_SECONDS
+    print(f"👀 Watching {Config.CONTEST_SLUG} (every {interval:g}s)...")
+    Config.validate()
+    metrics.reset()
+    metrics.start_periodic(Config.OUTPUT_DIR)
+
+    watcher = ContestWatcher(HackerRankCollector(), CodeAnalyzer(force=args.force or None),
+                             SubmissionStore(Config.STORE_PATH), Config.OUTPUT_DIR)
+    if not watcher.start():
+        metrics.finish(Config.OUTPUT_DIR)
+        return
+    # Later polls only pay for what changed
+    watcher.analyzer.force = False
+
+    polls = 0
+    try:
+        while args.polls is None or polls < args.polls:
+            time.sleep(interval)
+            polls += 1
+            try:
+                count = watcher.poll()
+            except CollectionError as e:
+                # The watermark is only advanced once a delta is complete, so the next poll retries it
+                print(f"⚠️ Poll failed: {e}")
+                continue
+            stamp = time.strftime("%H:%M:%S")
+            print(f"[{stamp}] {count} new submissions" if count else f"[{stamp}] No new submissions.")
+            metrics.write(Config.OUTPUT_DIR)
+    except KeyboardInterrupt:
+        print("\nStopped.")
+    metrics.finish(Config.OUTPUT_DIR)
+
+if __name__ == "__main__":
+    main()